@@ -0,0 +1,43 @@
+import argparse
+import importlib
+import sys
+
+# Single entry point for the pipeline scripts:
+#
+#   python aadhaar_intel.py prep --chunksize 500000
+#   python aadhaar_intel.py pipeline --only 03
+#   python aadhaar_intel.py visuals --by-state
+#   python aadhaar_intel.py serve --port 8080
+#   python aadhaar_intel.py shard run --shards 4
+#
+# Only the chosen subcommand's module is imported, and each script defers its
+# own heavy imports (plotting, the partitioned backend) to the code paths that
+# use them, so short invocations start quickly. Arguments after the
+# subcommand are passed to that script's main() unchanged.
+
+COMMANDS = {
+    'prep': ('run_01_prep', "aggregate raw state files into district_monthly_* tables"),
+    'pipeline': ('run_pipeline', "run the cached pipeline stages"),
+    'visuals': ('run_visuals', "render the strategic visuals"),
+    'serve': ('serve', "serve the outputs over local HTTP"),
+    'shard': ('shard', "run stages 02-06 sharded by state (worker / merge / run)"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='aadhaar-intel', description="Aadhaar service demand intelligence pipeline",
+        epilog="commands:\n" + "\n".join(f"  {name:<10}{text}" for name, (_, text) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=list(COMMANDS), metavar='command', help="see below; '<command> --help' for its options")
+    parser.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    module = importlib.import_module(COMMANDS[args.command][0])
+    # Scripts name themselves after argv[0] (argparse usage, instrument records)
+    sys.argv = [module.__file__, *args.args]
+    return module.main(args.args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import benchlib
+import cube
+import keys
+import stages
+import storage
+
+# Benchmark: rollups from the demand cube (cube.py) vs the pandas groupby
+# paths the stages and plots use today, on synthetic district_monthly tables
+# or the working directory's. Every query is cross-checked before timing;
+# the one-off cube build is reported separately.
+#
+#   python bench_cube.py --districts 800 8000 --months 36
+
+
+def queries(tables, coded, c):
+    """(name, pandas path, cube path, comparison of their results) for each benchmarked rollup."""
+    df_all = pd.concat([coded[k] for k in stages.CATEGORIES])
+    raw_all = pd.concat(tables.values())
+    state = raw_all['state'].iloc[0]
+    same = lambda a, b: np.array_equal(a, b)  # noqa: E731
+    return [
+        ('02 volume per district x category',
+         lambda: [stages.category_volume(coded[k], k) for k in stages.CATEGORIES],
+         lambda: [c.rollup(['district'], names=False, category=k) for k in stages.CATEGORIES],
+         lambda p, q: all(same(a.iloc[:, 1], b['total']) for a, b in zip(p, q))),
+        ('03/05 district x month totals',
+         lambda: stages.monthly_totals(df_all),
+         lambda: c.rollup(['district', 'month'], names=False),
+         lambda p, q: same(p[stages.MONTH_KEYS + ['total']], q[stages.MONTH_KEYS + ['total']])),
+        ('04 age sums per district',
+         lambda: stages.age_sums(df_all),
+         lambda: c.array(['district', 'age_band'])[0],
+         lambda p, q: same(p[stages.AGE_COLS], q[p[keys.ID]])),
+        ('state x month totals',
+         lambda: raw_all.groupby(['state', 'month'])['total'].sum(),
+         lambda: c.rollup(['state', 'month']),
+         lambda p, q: same(p.to_numpy(), q['total'])),
+        ('state x district x month totals',
+         lambda: raw_all.groupby(['state', 'district', 'month'])['total'].sum(),
+         lambda: c.rollup(['state', 'district', 'month']),
+         lambda p, q: same(p.to_numpy(), q['total']) and same(p.index.to_frame(index=False), q[['state', 'district', 'month']])),
+        (f'one state by month ({state}, enrollment)',
+         lambda: tables['enrollment'][tables['enrollment']['state'] == state].groupby('month')['total'].sum(),
+         lambda: c.rollup(['month'], state=state, category='enrollment'),
+         lambda p, q: same(p.to_numpy(), q['total'])),
+        ('national total',
+         lambda: sum(df['total'].sum() for df in tables.values()),
+         lambda: c.total(),
+         lambda p, q: p == q),
+    ]
+
+
+def run(name, tables, repeats):
+    index = keys.DistrictIndex.from_frames(tables.values())
+    coded = {k: index.encode(df) for k, df in tables.items()}
+    c, build = benchlib.best_of(1, cube.Cube.build, tables, index)
+    rows = sum(len(df) for df in tables.values())
+    print(f"{name}: {rows:,} district_monthly rows, cube {c.values.shape} built in {build:.2f}s "
+          f"({c.values.nbytes / 1e6:.1f} MB)")
+    for label, pandas_path, cube_path, check in queries(tables, coded, c):
+        expected, t_pandas = benchlib.best_of(repeats, pandas_path)
+        got, t_cube = benchlib.best_of(repeats, cube_path)
+        if not check(expected, got):
+            raise AssertionError(f"{label}: cube result differs from the pandas path")
+        print(f"  {label:<40} pandas {t_pandas * 1000:9.2f}ms  cube {t_cube * 1000:8.2f}ms  "
+              f"(x{t_pandas / t_cube:,.0f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark demand cube rollups against pandas groupby paths")
+    parser.add_argument('--districts', type=int, nargs='+', default=[800, 8000])
+    parser.add_argument('--months', type=int, default=36)
+    parser.add_argument('--working-dir', action='store_true', help="use the district_monthly tables here instead")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.working_dir:
+        run('district_monthly', {k: storage.read_table(t) for k, t in cube.CATEGORY_TABLES.items()}, args.repeats)
+    else:
+        for districts in args.districts:
+            run(f'synthetic {districts} districts x {args.months} months',
+                benchlib.district_monthly_tables(districts, args.months), args.repeats)
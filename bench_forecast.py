@@ -0,0 +1,48 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import benchlib
+import forecast
+import keys
+import run_pipeline
+import stages
+
+# Backtest and timing harness for the stage 07 forecasting models.
+# Scores each model, and the per-series model selection, over rolling
+# origins on either the working directory's district_monthly tables or
+# synthetic seasonal/trending series, and times a full fit + forecast of
+# all series at once.
+
+
+def working_directory_series():
+    """Stacked (category x district) series from the district_monthly tables."""
+    sources, _ = run_pipeline.load_sources()
+    frames = [sources[name] for name in run_pipeline.CATEGORY_FRAMES]
+    months = np.concatenate([df[keys.MONTH_ID].to_numpy() for df in frames]).astype(np.intp)
+    n = max(int(df[keys.ID].max()) for df in frames) + 1
+    y = np.concatenate([stages.series_matrix(df, n, months.min(), months.max() - months.min() + 1) for df in frames])
+    return y[~np.isnan(y).all(axis=1)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest stage 07 forecasting models and time them")
+    parser.add_argument('--series', type=int, nargs='+', default=[10_000, 50_000],
+                        help="synthetic series counts (ignored with --working-dir)")
+    parser.add_argument('--months', type=int, default=48)
+    parser.add_argument('--working-dir', action='store_true', help="backtest the district_monthly tables instead")
+    parser.add_argument('--horizon', type=int, default=forecast.FORECAST_HORIZON)
+    parser.add_argument('--origins', type=int, default=6, help="rolling forecast origins to score")
+    args = parser.parse_args()
+
+    datasets = [('district_monthly', working_directory_series())] if args.working_dir else [
+        (f'synthetic x{n}', benchlib.monthly_series(n, args.months)) for n in args.series]
+    for name, y in datasets:
+        (_, choice), fit_seconds = benchlib.timed(forecast.forecast, y, args.horizon)
+        report, backtest_seconds = benchlib.timed(forecast.backtest, y, args.horizon, args.origins)
+        chosen = pd.Series(np.array(forecast.MODELS)[choice]).value_counts()
+        print(f"{name}: {y.shape[0]} series x {y.shape[1]} months, fit+forecast {fit_seconds:.2f}s, "
+              f"backtest over {args.origins} origins {backtest_seconds:.2f}s")
+        print(report.round(3).to_string(index=False))
+        print("models selected: " + ", ".join(f"{m} {c}" for m, c in chosen.items()) + "\n")
@@ -0,0 +1,70 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import benchlib
+import keys
+import stages
+
+# Benchmark: per-group Python (groupby().apply(get_growth) and the stage-05
+# district loop, as run_pipeline had them) vs the segment-array kernels in
+# stages.district_metrics / stages.detect_spikes, on a synthetic
+# district_monthly frame with many groups. Results are cross-checked first.
+
+
+def legacy_growth(district_monthly):
+    def get_growth(x):
+        if len(x) < 2: return 0
+        return x['total'].pct_change().mean()
+
+    growth = district_monthly.groupby(['state', 'district']).apply(get_growth).reset_index(name='monthly_growth_rate')
+    return growth['monthly_growth_rate'].fillna(0)
+
+
+def legacy_spikes(district_monthly):
+    results = []
+    for (state, dist), group in district_monthly.groupby(['state', 'district']):
+        mean = group['total'].mean()
+        std = group['total'].std()
+        if std == 0: continue
+        spikes = group[group['total'] > mean + 2*std]
+        spike_months = spikes['month'].tolist()
+        spike_type = 'Irregular/Migration'
+        if len(spike_months) > 1:
+            spike_type = 'Seasonal Pattern'
+        if len(spike_months) > 0:
+            results.append({'state': state, 'district': dist, 'spike_months': str(spike_months),
+                            'spike_type': spike_type, 'volatility': std})
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-group Python vs segment kernels for stages 03/05")
+    parser.add_argument('--groups', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--months', type=int, default=12)
+    args = parser.parse_args()
+
+    for groups in args.groups:
+        raw = benchlib.combined_monthly(groups, args.months)
+        index = keys.DistrictIndex.from_frames([raw])
+        coded = stages.monthly_totals(index.encode(raw))
+        dm = index.decode(coded)
+
+        old_growth, t_old_growth = benchlib.timed(legacy_growth, dm)
+        metrics, t_new_growth = benchlib.timed(stages.district_metrics, coded)
+        if not np.allclose(old_growth, metrics['monthly_growth_rate'], equal_nan=True):
+            raise AssertionError("monthly_growth_rate mismatch")
+
+        old_spikes, t_old_spikes = benchlib.timed(legacy_spikes, dm)
+        new_spikes, t_new_spikes = benchlib.timed(stages.detect_spikes, coded)
+        new_spikes = index.decode(new_spikes)
+        for col in ['state', 'district', 'spike_months', 'spike_type']:
+            if not (old_spikes[col].to_numpy() == new_spikes[col].to_numpy()).all():
+                raise AssertionError(f"{col} mismatch")
+        if not np.allclose(old_spikes['volatility'], new_spikes['volatility']):
+            raise AssertionError("volatility mismatch")
+
+        print(f"{groups:>8} groups ({len(dm)} rows): "
+              f"growth {t_old_growth:7.2f}s -> {t_new_growth:6.3f}s (x{t_old_growth / t_new_growth:,.0f}), "
+              f"spikes {t_old_spikes:7.2f}s -> {t_new_spikes:6.3f}s (x{t_old_spikes / t_new_spikes:,.0f})")
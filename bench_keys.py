@@ -0,0 +1,69 @@
+import argparse
+
+import pandas as pd
+
+import benchlib
+import keys
+import stages
+
+# Benchmark: string (state, district, month) keys vs the integer district_id /
+# month_id codes from keys.py, on synthetic district_monthly frames. Compares
+# the frames' memory and the groupby/join work of stages 02-04 (category
+# volumes, the 02 three-way join, monthly totals, age sums and the 04 joins).
+# Results are cross-checked after decoding.
+
+NAME_KEYS = ['state', 'district']
+
+
+def string_keyed(frames):
+    """Stages 02-04 groupbys and joins as they were done on name keys."""
+    en, bi, de = [df.groupby(NAME_KEYS)['total'].sum().reset_index().rename(columns={'total': f'{c}_vol'})
+                  for df, c in zip(frames, stages.CATEGORIES)]
+    master = en.merge(bi, on=NAME_KEYS).merge(de, on=NAME_KEYS)
+    df_all = pd.concat(frames)
+    monthly = df_all.groupby(NAME_KEYS + ['month'])['total'].sum().reset_index()
+    metrics = monthly.groupby(NAME_KEYS)['total'].agg(total_volume='sum', volatility='std').reset_index()
+    age_sum = df_all.groupby(NAME_KEYS)[stages.AGE_COLS + ['total']].sum().reset_index()
+    combined = age_sum.merge(metrics[NAME_KEYS + ['volatility']], on=NAME_KEYS)
+    combined = combined.merge(master[NAME_KEYS + ['enrollment_vol']], on=NAME_KEYS)
+    return master, monthly, combined
+
+
+def id_keyed(frames):
+    """The same work on district_id / month_id codes."""
+    en, bi, de = [stages.category_volume(df, c) for df, c in zip(frames, stages.CATEGORIES)]
+    master = keys.join(keys.join(en, bi), de)
+    df_all = pd.concat(frames)
+    monthly = stages.monthly_totals(df_all)
+    metrics = monthly.groupby(stages.KEYS)['total'].agg(total_volume='sum', volatility='std').reset_index()
+    age_sum = stages.age_sums(df_all)
+    combined = keys.join(age_sum, metrics[stages.KEYS + ['volatility']])
+    combined = keys.join(combined, master[stages.KEYS + ['enrollment_vol']])
+    return master, monthly, combined
+
+
+def megabytes(frames):
+    return sum(df.memory_usage(deep=True).sum() for df in frames) / 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark string vs integer-coded district/month keys")
+    parser.add_argument('--districts', type=int, nargs='+', default=[800, 8000])
+    parser.add_argument('--months', type=int, default=60)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    for districts in args.districts:
+        frames = list(benchlib.district_monthly_tables(districts, args.months).values())
+        (index, coded), t_encode = benchlib.timed(lambda: (lambda i: (i, [i.encode(df) for df in frames]))(
+            keys.DistrictIndex.from_frames(frames)))
+
+        old, t_old = benchlib.best_of(args.repeats, string_keyed, frames)
+        new, t_new = benchlib.best_of(args.repeats, id_keyed, coded)
+        for name, a, b in zip(['master', 'monthly', 'combined'], old, new):
+            if not a.equals(index.decode(b)[list(a.columns)].astype(a.dtypes.to_dict())):
+                raise AssertionError(f"{name} mismatch")
+
+        rows = sum(len(df) for df in frames)
+        print(f"{districts:>7} districts ({rows} rows): memory {megabytes(frames):7.1f} MB -> {megabytes(coded):6.1f} MB, "
+              f"groupby+join {t_old:6.3f}s -> {t_new:6.3f}s (x{t_old / t_new:.1f}), one-off encode {t_encode:.3f}s")
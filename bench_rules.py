@@ -0,0 +1,105 @@
+import argparse
+
+import pandas as pd
+
+import benchlib
+import rules
+
+# Micro-benchmark: row-wise DataFrame.apply classification (the pre-rules.py
+# run_pipeline code, kept here verbatim as the baseline) vs the vectorized
+# rule tables. Every result is checked for equality before timing is reported.
+
+
+def legacy_classify(row):
+    s = row['dominance_score']
+    if row['enrollment_ratio'] == s: t = 'Enrollment'
+    elif row['biometric_ratio'] == s: t = 'Biometric'
+    else: t = 'Demographic'
+    if s >= 0.6: st = 'Strong Dominant'
+    elif s >= 0.4: st = 'Mixed Demand'
+    else: st = 'Balanced Demand'
+    return pd.Series([t, st])
+
+
+def legacy_op_meaning(row):
+    if row['dominance_strength'] == 'Strong Dominant':
+        if row['dominant_type'] == 'Enrollment': return 'New Population Entry'
+        if row['dominant_type'] == 'Biometric': return 'Maintenance Burden'
+    return 'General Service Load'
+
+
+def legacy_classify_pressure(x):
+    if x >= 0.75: return 'Critical Infrastructure Stress'
+    if x >= 0.55: return 'High Stress'
+    if x >= 0.35: return 'Moderate Stress'
+    return 'Stable'
+
+
+def legacy_get_typology(row):
+    tier = row['pressure_tier']
+    is_high_crit = tier in ['High Stress', 'Critical Infrastructure Stress']
+    if row['child_ratio'] > 0.6 and is_high_crit:
+        return 'School-linked Surge Zone'
+    if row['adult_ratio'] > 0.7 and is_high_crit:
+        return 'Correctional Overload Zone'
+    if row['dominant_type'] == 'Biometric' and row['volatility'] > 100:
+        return 'Migration Impact Zone'
+    return 'Population Expansion Zone'
+
+
+def legacy_recommend(row):
+    action = "Deploy mobile enrollment vans"
+    rationale = "High adult correction load + volatility indicates migrant churn."
+    if row['typology'] == 'School-linked Surge Zone':
+        action = "Launch school-based biometric drives"
+        rationale = "High child ratio indicates school admission season pressure."
+    elif row['typology'] == 'Correctional Overload Zone':
+        action = "Set up temporary camps"
+        rationale = "Adult dominance suggests high demand for updates."
+    elif row['pressure_tier'] == 'Critical Infrastructure Stress':
+        action = "Set up temporary camps"
+        rationale = "Critical stress levels require immediate capacity expansion."
+    elif row['dominance_strength'] == 'Strong Dominant':
+        if row['dominant_type'] == 'Biometric':
+            action = "Increase biometric operators"
+            rationale = "Biometric heavy load requires specialized operators."
+    return pd.Series([action, rationale])
+
+
+def run_legacy(df):
+    df = df.copy()
+    df[['dominant_type', 'dominance_strength']] = df.apply(legacy_classify, axis=1)
+    df['operational_meaning'] = df.apply(legacy_op_meaning, axis=1)
+    df['pressure_tier'] = df['pressure_index'].apply(legacy_classify_pressure)
+    df['typology'] = df.apply(legacy_get_typology, axis=1)
+    df[['recommended_action', 'rationale']] = df.apply(legacy_recommend, axis=1)
+    return df
+
+
+def run_vectorized(df):
+    df = df.copy()
+    df['dominant_type'], df['dominance_strength'] = rules.classify_dominance(df)
+    df['operational_meaning'] = rules.operational_meaning(df)
+    df['pressure_tier'] = rules.classify_pressure(df['pressure_index'])
+    df['typology'] = rules.typology(df)
+    df['recommended_action'], df['rationale'] = rules.recommend(df)
+    return df
+
+
+LABEL_COLS = ['dominant_type', 'dominance_strength', 'operational_meaning', 'pressure_tier',
+              'typology', 'recommended_action', 'rationale']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark row-wise vs vectorized classification rules")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        df = benchlib.district_features(n)
+        legacy, t_legacy = benchlib.timed(run_legacy, df)
+        vectorized, t_vec = benchlib.timed(run_vectorized, df)
+        for col in LABEL_COLS:
+            if not (legacy[col].astype(object).to_numpy() == vectorized[col].astype(object).to_numpy()).all():
+                raise AssertionError(f"Mismatch in {col} at n={n}")
+        print(f"{n:>8} districts: apply {t_legacy:8.3f}s  rules {t_vec:8.4f}s  speedup x{t_legacy / t_vec:,.0f}")
@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import benchlib
+import synth
+
+# Benchmark: run_01_prep, run_pipeline (in-memory and partitioned backends,
+# with partitioning timed as its own stage) and run_visuals at 1x/10x/100x
+# scale.
+#
+# For each scale a seeded synthetic dataset of scale * --base-rows raw rows is
+# generated with synth.py (reused across runs while its parameters match),
+# then each stage runs as its own process inside the dataset directory.
+# Wall time, rows/s and the stage process's peak RSS are printed and appended
+# to bench_results.jsonl together with the git commit, so later performance
+# changes can be compared against this baseline.
+#
+#   python bench_scale.py --scales 1 10 100
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = {
+    'prep': ['run_01_prep.py'],
+    'pipeline': ['run_pipeline.py', '--no-cache'],
+    'partition': ['partitioned.py', '--root', 'partitions'],
+    'partitioned': ['run_pipeline.py', '--backend', 'partitioned'],
+    'visuals': ['run_visuals.py', '--force'],
+}
+DEFAULT_RESULTS_FILE = 'bench_results.jsonl'
+
+
+def dataset(root, scale, base_rows, seed):
+    """Directory holding the synthetic dataset for ``scale``, generating it if needed."""
+    out_dir = os.path.join(root, f"x{scale:g}")
+    rows = int(scale * base_rows)
+    try:
+        with open(os.path.join(out_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest['rows'] == rows and manifest['seed'] == seed:
+            return out_dir, manifest
+    except (OSError, ValueError, KeyError):
+        pass
+    print(f"Generating {rows} rows for scale x{scale:g} in {out_dir}...")
+    manifest, seconds = benchlib.timed(lambda: synth.generate(out_dir, rows, seed=seed))
+    print(f"  generated in {seconds:.1f}s")
+    return out_dir, manifest
+
+
+def run_stage(args, cwd, env):
+    """(exit code, wall seconds, peak RSS in KB) of one stage process."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, *args], cwd=cwd, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # wait4 reports the rusage of this child alone, unlike RUSAGE_CHILDREN
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    error = proc.stderr.read().decode(errors='replace').strip().splitlines()
+    proc.stderr.close()
+    peak = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    return proc.returncode, wall, peak, error[-1] if proc.returncode and error else ''
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_results(path):
+    """Latest recorded result per (scale, stage)."""
+    latest = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    latest[(record['scale'], record['stage'])] = record
+    return latest
+
+
+def run(scales, stages, base_rows, root, results_path, workers, seed):
+    previous = previous_results(results_path)
+    commit = git_commit()
+    env = dict(os.environ)
+    env['AADHAAR_FILE_MAP'] = 'file_map.json'
+    env['AADHAAR_METRICS'] = ''
+
+    print(f"{'scale':>6} {'stage':<9} {'raw_rows':>11} {'wall_s':>9} {'rows/s':>11} {'peak_mb':>9} {'vs_last':>8}")
+    for scale in scales:
+        data_dir, manifest = dataset(root, scale, base_rows, seed)
+        raw_rows = sum(manifest['files'].values())
+        for stage in stages:
+            args = [os.path.join(SCRIPT_DIR, STAGES[stage][0]), *STAGES[stage][1:]]
+            if stage in ('prep', 'visuals') and workers > 1:
+                args += ['--workers', str(workers)]
+            code, wall, peak_kb, error = run_stage(args, data_dir, env)
+
+            record = {
+                'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'commit': commit, 'scale': scale, 'stage': stage, 'raw_rows': raw_rows, 'workers': workers,
+                'status': 'ok' if code == 0 else f'exit {code}', 'wall_s': round(wall, 3),
+                'rows_per_s': round(raw_rows / wall), 'peak_rss_mb': round(peak_kb / 1024, 1),
+            }
+            if error:
+                record['error'] = error
+            last = previous.get((scale, stage))
+            change = f"{(wall / last['wall_s'] - 1) * 100:+.0f}%" if last and last['wall_s'] else ''
+            print(f"{scale:>6g} {stage:<9} {raw_rows:>11} {wall:>9.2f} {record['rows_per_s']:>11} "
+                  f"{record['peak_rss_mb']:>9} {change:>8}" + (f"  {record['status']}: {error}" if code else ''))
+            with open(results_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage on synthetic data at several scales")
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--base-rows', type=int, default=1_000_000, help="raw rows at scale 1")
+    parser.add_argument('--data-root', default='bench_data', help="where generated datasets are kept between runs")
+    parser.add_argument('--results', default=DEFAULT_RESULTS_FILE)
+    parser.add_argument('--workers', type=int, default=1, help="--workers passed to prep and visuals")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    run(args.scales, args.stages, args.base_rows, args.data_root, os.path.abspath(args.results), args.workers, args.seed)
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+import storage
+
+# Load test for serve.py: starts the service (unless --port points at a
+# running one), opens N keep-alive connections and fires a mix of point
+# lookups, top-N and tier filters, then reports latency percentiles and
+# throughput.
+
+
+def request_mix(count, seed=0):
+    districts = storage.read_table('03_output', columns=['state', 'district', 'pressure_tier'])
+    rng = random.Random(seed)
+    keys = list(districts[['state', 'district']].itertuples(index=False, name=None))
+    tiers = sorted(districts['pressure_tier'].unique())
+    targets = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.8:
+            state, district = rng.choice(keys)
+            targets.append(f"/district?state={quote(state)}&district={quote(district)}")
+        elif kind < 0.9:
+            targets.append(f"/top?n={rng.choice([5, 10, 50])}")
+        else:
+            targets.append(f"/districts?tier={quote(rng.choice(tiers))}")
+    return targets
+
+
+async def client(host, port, targets, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    for target in targets:
+        start = time.perf_counter()
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+        await writer.drain()
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def load_test(host, port, targets, connections):
+    latencies = []
+    slices = [targets[i::connections] for i in range(connections)]
+    start = time.perf_counter()
+    await asyncio.gather(*[client(host, port, s, latencies) for s in slices])
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    print(f"{len(latencies)} requests over {connections} connections in {elapsed:.2f}s")
+    print(f"  p50 {np.percentile(ms, 50):.3f} ms   p99 {np.percentile(ms, 99):.3f} ms   "
+          f"max {ms.max():.3f} ms   {len(latencies) / elapsed:,.0f} req/s")
+
+
+async def wait_ready(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("query service did not start")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the local query service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help="target an already running service instead of starting one")
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--connections', type=int, default=16)
+    args = parser.parse_args()
+
+    server = None
+    port = args.port
+    if port is None:
+        port = 18080
+        server = subprocess.Popen([sys.executable, 'serve.py', '--host', args.host, '--port', str(port)])
+    try:
+        asyncio.run(wait_ready(args.host, port))
+        asyncio.run(load_test(args.host, port, request_mix(args.requests), args.connections))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,44 @@
+import argparse
+
+import benchlib
+import keys
+import spikes
+
+# Benchmark for the spike engine (spikes.py) at daily granularity.
+#
+# Generates seeded daily series per district and category (weekly and yearly
+# seasonality, noise, late starts) with known injected surges, runs
+# spikes.spike_table over all of them and reports wall time, peak matrix
+# size, and recall/precision of each baseline against the injected surges.
+#
+#   python bench_spikes.py --districts 800 --years 3
+
+
+def score(table, injected):
+    found = set(zip(table['category'].astype(str), table[keys.ID], table['day']))
+    hits = len(found & injected)
+    return hits / max(len(injected), 1), hits / max(len(found), 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the spike engine on synthetic daily district series")
+    parser.add_argument('--districts', type=int, default=800)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--window', type=int, default=28, help="rolling baseline length in days")
+    parser.add_argument('--season', type=int, default=364, help="seasonal lag in days (364 keeps the weekday)")
+    parser.add_argument('--surge-rate', type=float, default=0.002, help="share of days with an injected surge")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    frames, injected = benchlib.daily_series(args.districts, args.years, args.surge_rate, args.seed)
+    cells = sum(len(df) for df in frames.values())
+    table, elapsed = benchlib.timed(lambda: spikes.spike_table(frames, period='day', window=args.window,
+                                                               season=args.season))
+
+    print(f"{args.districts} districts x {args.years} years daily x {len(frames)} categories "
+          f"({cells:,} observed days): {len(table):,} spikes in {elapsed:.2f}s ({cells / elapsed:,.0f} days/s)")
+    for baseline in spikes.BASELINES:
+        recall, precision = score(table[table['baseline'] == baseline], injected)
+        print(f"  {baseline:<9} recall {recall:6.1%}  precision {precision:6.1%}")
+    recall, precision = score(table, injected)
+    print(f"  {'either':<9} recall {recall:6.1%}  precision {precision:6.1%}  ({len(injected):,} injected surges)")
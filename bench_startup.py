@@ -0,0 +1,84 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import benchlib
+
+# Startup benchmark for the CLI scripts: `python -X importtime` cumulative
+# import cost of each script module, and wall time of `<script> --help`,
+# for the working tree and optionally a baseline git revision.
+#
+#   python bench_startup.py --baseline HEAD~1
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES = ['run_01_prep', 'run_pipeline', 'run_visuals', 'serve']
+
+
+def import_time(module, cwd):
+    """(cumulative import microseconds of ``module``, its direct imports by cumulative cost)."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=cwd,
+                          capture_output=True, text=True, check=True)
+    children = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nesting is shown by indentation: 1 space at the top level, 2 more per level.
+        # A module is reported after everything it imported.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative), name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                return int(cumulative), sorted(children, reverse=True)
+            children = []
+    raise ValueError(f"No import time reported for {module}")
+
+
+def help_time(script, cwd):
+    _, seconds = benchlib.timed(lambda: subprocess.run([sys.executable, script, '--help'], cwd=cwd,
+                                                       capture_output=True, check=True))
+    return seconds
+
+
+def measure(cwd, repeats):
+    results = {}
+    for module in MODULES:
+        imports = [import_time(module, cwd) for _ in range(repeats)]
+        total, top = min(imports)
+        wall = min(help_time(f'{module}.py', cwd) for _ in range(repeats))
+        results[module] = (total, top, wall)
+    return results
+
+
+def checkout(revision, directory):
+    """Extract the tree at ``revision`` into ``directory``."""
+    archive = subprocess.run(['git', 'archive', revision], cwd=SCRIPT_DIR, capture_output=True, check=True).stdout
+    subprocess.run(['tar', '-x', '-C', directory], input=archive, check=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare CLI import/startup time against a baseline revision")
+    parser.add_argument('--baseline', default=None, help="git revision to compare against (e.g. HEAD~1)")
+    parser.add_argument('--repeats', type=int, default=5, help="runs per measurement; the fastest is kept")
+    parser.add_argument('--top', type=int, default=3, help="heaviest direct imports to list per module")
+    args = parser.parse_args()
+
+    current = measure(SCRIPT_DIR, args.repeats)
+    baseline = None
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as tmp:
+            checkout(args.baseline, tmp)
+            baseline = measure(tmp, args.repeats)
+
+    print(f"{'module':<14} {'import_ms':>10} {'base_ms':>9} {'help_ms':>8} {'base_ms':>8}  heaviest imports")
+    for module, (total, top, wall) in current.items():
+        base_import = f"{baseline[module][0] / 1000:9.0f}" if baseline else f"{'':>9}"
+        base_help = f"{baseline[module][2] * 1000:8.0f}" if baseline else f"{'':>8}"
+        heaviest = [f"{name} {us / 1000:.0f}ms" for us, name in top[:args.top]]
+        print(f"{module:<14} {total / 1000:10.0f} {base_import} {wall * 1000:8.0f} {base_help}  "
+              f"{', '.join(heaviest)}")
+    entry = min(help_time('aadhaar_intel.py', SCRIPT_DIR) for _ in range(args.repeats))
+    print(f"aadhaar_intel.py --help: {entry * 1000:.0f}ms")
@@ -0,0 +1,58 @@
+import argparse
+import os
+import tempfile
+
+import pandas as pd
+
+import benchlib
+import storage
+
+# Benchmark: CSV vs columnar intermediate tables.
+# Measures file size, full load time and projected load time (the columns
+# run_visuals needs for plots 4/5) for each storage format.
+
+TABLES = ['district_monthly_enrollment', 'district_monthly_biometric', 'district_monthly_demographic']
+PROJECTION = ['district', 'month', 'total']
+
+
+def scaled(df, scale):
+    """Replicate a district_monthly frame `scale` times with distinct district names."""
+    if scale <= 1:
+        return df
+    copies = []
+    for i in range(scale):
+        part = df.copy()
+        part['district'] = part['district'] + f' {i}'
+        copies.append(part)
+    return pd.concat(copies, ignore_index=True)
+
+
+def run(scale, repeats):
+    frames = {name: scaled(storage.read_table(name), scale) for name in TABLES}
+    rows = sum(len(df) for df in frames.values())
+    print(f"Benchmarking {len(TABLES)} tables, {rows} rows total (scale x{scale}, best of {repeats})")
+
+    formats = ['csv'] + [f for f in ('parquet', 'arrow') if storage._columnar_available()]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in formats:
+            size = 0
+            for name, df in frames.items():
+                size += os.path.getsize(storage.write_table(df, name, fmt, tmp))
+            _, full = benchlib.best_of(repeats, lambda: [storage.read_table(n, fmt=fmt, directory=tmp) for n in TABLES])
+            _, proj = benchlib.best_of(repeats, lambda: [storage.read_table(n, PROJECTION, fmt=fmt, directory=tmp) for n in TABLES])
+            results.append({'format': fmt, 'size_kb': size / 1024, 'full_load_ms': full * 1000, 'projected_load_ms': proj * 1000})
+
+    report = pd.DataFrame(results).set_index('format')
+    report['size_vs_csv'] = report['size_kb'] / report.loc['csv', 'size_kb']
+    report['load_speedup_vs_csv'] = report.loc['csv', 'full_load_ms'] / report['full_load_ms']
+    print(report.round(3).to_string())
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare CSV and columnar storage for district_monthly tables")
+    parser.add_argument('--scale', type=int, default=1, help="replicate the input tables this many times")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    run(args.scale, args.repeats)
@@ -0,0 +1,134 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+import keys
+import stages
+import synth
+
+# Helpers shared by the bench_*.py scripts: timing and seeded synthetic inputs.
+#
+# Every generator takes a seed, so repeated runs of a benchmark (and before /
+# after comparisons across commits) see the same data. Raw state files for
+# end-to-end runs come from synth.py; the frames here are the intermediate
+# shapes individual stages consume.
+
+
+def timed(func, *args):
+    """(result, seconds) of one call."""
+    start = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - start
+
+
+def best_of(repeats, func, *args):
+    """(result, seconds) of the fastest of ``repeats`` calls."""
+    best, out = float('inf'), None
+    for _ in range(repeats):
+        out, seconds = timed(func, *args)
+        best = min(best, seconds)
+    return out, best
+
+
+def district_monthly_tables(districts, months, seed=0):
+    """district_monthly tables per category: ~90% of district-months present, Poisson age counts.
+
+    Districts get synth.py-style names and a random state each.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(synth.district_names(districts, rng), dtype=object)
+    states = np.array(synth.STATES, dtype=object)[rng.integers(0, len(synth.STATES), size=districts)]
+    labels = pd.period_range('2022-01', periods=months, freq='M').strftime('%Y-%m').to_numpy(dtype=object)
+    d, m = np.divmod(np.arange(districts * months), months)
+    tables = {}
+    for category in stages.CATEGORIES:
+        keep = rng.random(len(d)) < 0.9
+        dk, mk = d[keep], m[keep]
+        level = rng.lognormal(5, 1, size=districts)[dk]
+        df = pd.DataFrame({'state': states[dk], 'district': names[dk], 'month': labels[mk]})
+        for share, col in zip([0.1, 0.3, 0.6], stages.AGE_COLS):
+            df[col] = rng.poisson(level * share)
+        df['total'] = df[stages.AGE_COLS].sum(axis=1)
+        tables[category] = df
+    return tables
+
+
+def combined_monthly(groups, months, seed=0):
+    """Combined district_monthly-shaped frame: ``groups`` districts with 1..``months`` months each.
+
+    About 1% of months are zero and 2% are five-fold spikes.
+    """
+    rng = np.random.default_rng(seed)
+    periods = pd.period_range('2023-01', periods=months, freq='M').strftime('%Y-%m')
+    lengths = rng.integers(1, months + 1, size=groups)
+    gid = np.repeat(np.arange(groups), lengths)
+    month_idx = np.concatenate([np.arange(n) for n in lengths])
+    base = rng.integers(0, 5_000, size=groups)[gid]
+    totals = base + rng.poisson(200, size=len(gid))
+    totals[rng.random(len(gid)) < 0.01] = 0
+    totals[rng.random(len(gid)) < 0.02] *= 5  # occasional spikes
+    return pd.DataFrame({
+        'state': np.char.add('S', (gid % 36).astype(str)),
+        'district': np.char.add('D', gid.astype(str)),
+        'month': np.asarray(periods)[month_idx],
+        'total': totals,
+    })
+
+
+def district_features(n, seed=0):
+    """One row per district with every column the classification rules read."""
+    rng = np.random.default_rng(seed)
+    vols = rng.integers(0, 10_000, size=(n, 3)).astype(float)
+    vols[rng.random(n) < 0.01] = 0  # empty districts give NaN ratios
+    with np.errstate(invalid='ignore'):
+        ratios = vols / vols.sum(axis=1, keepdims=True)
+    child = rng.random(n)
+    df = pd.DataFrame({
+        'enrollment_ratio': ratios[:, 0],
+        'biometric_ratio': ratios[:, 1],
+        'demographic_ratio': ratios[:, 2],
+        'pressure_index': rng.random(n),
+        'child_ratio': child,
+        'adult_ratio': 1 - child,
+        'volatility': rng.gamma(1.0, 150.0, size=n),
+    })
+    df['dominance_score'] = df[['enrollment_ratio', 'biometric_ratio', 'demographic_ratio']].max(axis=1)
+    return df
+
+
+def daily_series(districts, years, surge_rate, seed=0):
+    """(category frames of district id / day / total, set of injected (category, district, day) surges).
+
+    Series have weekly and yearly seasonality, Poisson noise and late starts.
+    """
+    rng = np.random.default_rng(seed)
+    days = 365 * years
+    t = np.arange(days)
+    frames, injected = {}, set()
+    for category in stages.CATEGORIES:
+        level = rng.lognormal(3, 1, size=(districts, 1))
+        season = (1 + 0.3 * np.sin(2 * np.pi * (t + rng.integers(0, 365, size=(districts, 1))) / 365)) * \
+                 np.where(t % 7 == 6, 0.4, 1.0)
+        lam = level * season
+        surge = rng.random((districts, days)) < surge_rate
+        y = rng.poisson(lam + surge * (6 * np.sqrt(lam) + 10 + 4 * lam)).astype(np.int64)
+        start = rng.integers(0, days // 4, size=districts)
+        live = t[None, :] >= start[:, None]
+        d, day = np.nonzero(live)
+        injected.update(zip([category] * int((surge & live).sum()), *np.nonzero(surge & live)))
+        frames[category] = pd.DataFrame({keys.ID: d.astype(np.int32), 'day': day.astype(np.int32), 'total': y[d, day]})
+    return frames, injected
+
+
+def monthly_series(n, months, seed=0):
+    """(n x months) monthly volumes with level, trend, yearly seasonality, noise and late starts."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(months)
+    level = rng.lognormal(6, 1, size=(n, 1))
+    trend = rng.normal(0, 0.01, size=(n, 1)) * level * t
+    season = 1 + rng.uniform(0, 0.4, size=(n, 1)) * np.sin(2 * np.pi * (t + rng.integers(0, 12, size=(n, 1))) / 12)
+    y = np.maximum(rng.poisson(np.maximum((level + trend) * season, 0)), 0).astype(float)
+    start = rng.integers(0, months // 3, size=n)
+    y[t[None, :] < start[:, None]] = np.nan
+    return y
@@ -0,0 +1,220 @@
+import argparse
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+import keys
+import stages
+import storage
+
+# Materialized demand cube over state x district x month x category x age band.
+#
+# The three district_monthly tables are folded once into a dense
+# (districts x months x categories x age bands) array, with a matching
+# (districts x months x categories) count of the base rows behind each cell.
+# Districts are numbered by a DistrictIndex, i.e. in sorted (state, district)
+# order, so each state's districts are one contiguous run and state totals
+# are segment sums over the district axis. Every marginal (district, state or
+# national level x any subset of month / category / age band) is summed once
+# when the cube is built, and rollup() answers a query by indexing the
+# smallest marginal that holds its dimensions, touching only the cells of the
+# result (plus any filtered-out values being summed away).
+#
+#   cube = Cube.load()
+#   cube.rollup(['state', 'month'], category='enrollment')
+#   cube.rollup(['district', 'age_band'], state='Delhi', month=['2025-09', '2025-10'])
+#
+# Result rows are the combinations backed by at least one district_monthly
+# row, as a groupby over those rows would return.
+
+CATEGORY_TABLES = {
+    'enrollment': 'district_monthly_enrollment',
+    'biometric': 'district_monthly_biometric',
+    'demographic': 'district_monthly_demographic'
+}
+AGE_BANDS = [c[len('age_'):] for c in stages.AGE_COLS]
+DIMS = ['state', 'district', 'month', 'category', 'age_band']
+INNER_DIMS = ['month', 'category', 'age_band']
+DEFAULT_PATH = 'cube.npz'
+
+
+class Cube:
+    """Dense demand cube with precomputed marginals and a rollup/slice API."""
+
+    def __init__(self, values, rows, names, first_month):
+        self.values = values
+        self.rows = rows
+        self.index = keys.DistrictIndex(names)
+        self.first_month = int(first_month)
+        self.state_codes, self.states = pd.factorize(self.index.names['state'])
+        self.state_starts = np.flatnonzero(np.r_[True, self.state_codes[1:] != self.state_codes[:-1]])
+        self.marginals = self._marginals()
+
+    @classmethod
+    def build(cls, frames, index=None):
+        """Cube from district_monthly frames keyed by category (state/district/month and age columns)."""
+        index = index or keys.DistrictIndex.from_frames(frames.values())
+        coded = {c: index.encode(frames[c]) for c in stages.CATEGORIES}
+        months = np.concatenate([df[keys.MONTH_ID].to_numpy() for df in coded.values()]).astype(np.intp)
+        first = months.min() if len(months) else 0
+        n_months = months.max() - first + 1 if len(months) else 0
+        dtype = np.result_type(*[df[stages.AGE_COLS].to_numpy().dtype for df in coded.values()])
+
+        values = np.zeros((len(index), n_months, len(stages.CATEGORIES), len(AGE_BANDS)), dtype=dtype)
+        rows = np.zeros((len(index), n_months, len(stages.CATEGORIES)), dtype=np.int64)
+        for c, category in enumerate(stages.CATEGORIES):
+            df = coded[category]
+            cell = (df[keys.ID].to_numpy(), df[keys.MONTH_ID].to_numpy().astype(np.intp) - first)
+            np.add.at(values[:, :, c], cell, df[stages.AGE_COLS].to_numpy())
+            np.add.at(rows[:, :, c], cell, 1)
+        return cls(values, rows, index.names, first)
+
+    @classmethod
+    def from_tables(cls, directory=""):
+        return cls.build({c: storage.read_table(t, directory=directory) for c, t in CATEGORY_TABLES.items()})
+
+    def save(self, path=DEFAULT_PATH):
+        np.savez(path, values=self.values, rows=self.rows, first_month=self.first_month,
+                 states=self.index.names['state'].to_numpy(dtype=str),
+                 districts=self.index.names['district'].to_numpy(dtype=str))
+        return path
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with np.load(path) as data:
+            names = pd.DataFrame({'state': data['states'].astype(object), 'district': data['districts'].astype(object)})
+            return cls(data['values'], data['rows'], names, data['first_month'])
+
+    def _marginals(self):
+        """(geo level, kept inner dims) -> (values, row counts) for every rollup level."""
+        marginals = {}
+        for r in range(len(INNER_DIMS) + 1):
+            for kept in combinations(INNER_DIMS, r):
+                dropped = tuple(1 + i for i, d in enumerate(INNER_DIMS) if d not in kept)
+                values = self.values.sum(axis=dropped) if dropped else self.values
+                counted = tuple(1 + i for i, d in enumerate(INNER_DIMS[:2]) if d not in kept)
+                rows = self.rows.sum(axis=counted) if counted else self.rows
+                if 'age_band' in kept:
+                    rows = np.broadcast_to(rows[..., None], values.shape)
+                marginals['district', kept] = (values, rows)
+                marginals['state', kept] = (np.add.reduceat(values, self.state_starts, axis=0),
+                                            np.add.reduceat(rows, self.state_starts, axis=0))
+                marginals[None, kept] = (values.sum(axis=0), rows.sum(axis=0))
+        return marginals
+
+    def _positions(self, dim, selected):
+        """Positions along ``dim``'s axis for one label or a list of labels."""
+        labels = [selected] if np.isscalar(selected) or isinstance(selected, tuple) else list(selected)
+        if dim == 'state':
+            lookup = {s: i for i, s in enumerate(self.states)}
+        elif dim == 'district':
+            # (state, district) pairs or district_id ints
+            pairs = [label for label in labels if isinstance(label, tuple)]
+            ids = self.index.lookup(pd.DataFrame(pairs, columns=keys.NAME_KEYS)) if pairs else []
+            lookup = dict(zip(pairs, ids))
+            lookup.update({label: label for label in labels if not isinstance(label, tuple)})
+        elif dim == 'month':
+            lookup = {label: int(keys.month_ordinals([label])[0]) - self.first_month for label in labels}
+        else:
+            lookup = {label: i for i, label in enumerate(stages.CATEGORIES if dim == 'category' else AGE_BANDS)}
+        positions = [lookup.get(label, -1) for label in labels]
+        bad = [label for label, p in zip(labels, positions) if not 0 <= p < self._size(dim)]
+        if bad:
+            raise KeyError(f"Unknown {dim} {bad}")
+        return np.array(positions, dtype=np.intp)
+
+    def _size(self, dim):
+        return {'state': len(self.states), 'district': len(self.index), 'month': self.values.shape[1],
+                'category': len(stages.CATEGORIES), 'age_band': len(AGE_BANDS)}[dim]
+
+    def array(self, by=(), **where):
+        """(values, row counts) as dense arrays with one axis per ``by`` dim, in ``by`` order.
+
+        ``where`` restricts any dimension to one label or a list of labels:
+        state names, (state, district) pairs or district ids, '%Y-%m' months,
+        category and age band names. 'state' alongside 'district' adds no
+        axis, as each district lies in one state.
+        """
+        values, rows, _, _ = self._select(list(by), where)
+        return values, rows
+
+    def _select(self, by, where):
+        """array() plus the ``by`` dims given axes and the positions along each axis."""
+        unknown = [d for d in by + list(where) if d not in DIMS]
+        if unknown or len(set(by)) != len(by):
+            raise ValueError(f"Bad rollup dims {by} / filters {list(where)}; dims are {DIMS}")
+        if 'state' in by and 'district' in by:
+            by = [d for d in by if d != 'state']
+        used = set(by) | set(where)
+        geo = 'district' if 'district' in used else 'state' if 'state' in used else None
+        kept = tuple(d for d in INNER_DIMS if d in used)
+        values, rows = self.marginals[geo, kept]
+        axes = ([geo] if geo else []) + list(kept)
+
+        selectors = [self._positions(d, where[d]) if d in where else np.arange(self._size(d)) for d in axes]
+        if geo == 'district' and 'state' in where:
+            in_states = np.isin(self.state_codes[selectors[0]], self._positions('state', where['state']))
+            selectors[0] = selectors[0][in_states]
+        values, rows = values[np.ix_(*selectors)], rows[np.ix_(*selectors)]
+
+        if geo == 'district' and 'state' in by and 'district' not in by:
+            # Selected districts keep the index order, so each state is one run
+            codes = self.state_codes[selectors[0]]
+            starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, np.intp)
+            values = np.add.reduceat(values, starts, axis=0) if len(starts) else values[:0]
+            rows = np.add.reduceat(rows, starts, axis=0) if len(starts) else rows[:0]
+            selectors[0] = np.unique(codes)
+            axes[0] = 'state'
+
+        summed = tuple(i for i, d in enumerate(axes) if d not in by)
+        if summed:
+            values, rows = values.sum(axis=summed), rows.sum(axis=summed)
+        remaining = [(d, s) for d, s in zip(axes, selectors) if d in by]
+        order = [[d for d, _ in remaining].index(d) for d in by]
+        return np.transpose(values, order), np.transpose(rows, order), by, [remaining[i][1] for i in order]
+
+    def rollup(self, by=(), names=True, **where):
+        """Totals per combination of ``by`` dims (filtered by ``where``), as a frame.
+
+        Only combinations backed by district_monthly rows are returned, in
+        dimension order. With names=False districts and months are given as
+        district_id / month_id codes, as the pipeline stages use them.
+        """
+        with_state = 'state' in by
+        values, rows, by, labels = self._select(list(by), where)
+        cells = np.nonzero(rows > 0)
+        out = {}
+        for dim, positions, at in zip(by, labels, cells):
+            chosen = positions[at]
+            if dim == 'state':
+                out['state'] = np.asarray(self.states, dtype=object)[chosen]
+            elif dim == 'district' and names:
+                out['state'] = self.index.names['state'].to_numpy()[chosen]
+                out['district'] = self.index.names['district'].to_numpy()[chosen]
+            elif dim == 'district':
+                if with_state:
+                    out['state'] = np.asarray(self.states, dtype=object)[self.state_codes[chosen]]
+                out[keys.ID] = chosen.astype(np.int32)
+            elif dim == 'month':
+                ordinals = (chosen + self.first_month).astype(np.int16)
+                out['month' if names else keys.MONTH_ID] = keys.month_labels(ordinals) if names else ordinals
+            else:
+                out[dim] = np.array(stages.CATEGORIES if dim == 'category' else AGE_BANDS, dtype=object)[chosen]
+        out['total'] = values[cells]
+        return pd.DataFrame(out)
+
+    def total(self, **where):
+        """Grand total of the cells matching ``where``."""
+        return self.array(**where)[0].item()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the demand cube from the district_monthly tables")
+    parser.add_argument('--dir', default="", help="directory holding the district_monthly tables")
+    parser.add_argument('--out', default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    cube = Cube.from_tables(args.dir)
+    print(f"Saved {cube.save(args.out)}: {len(cube.index)} districts x {cube.values.shape[1]} months x "
+          f"{len(stages.CATEGORIES)} categories x {len(AGE_BANDS)} age bands")
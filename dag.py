@@ -0,0 +1,197 @@
+import hashlib
+import inspect
+import os
+import pickle
+import time
+
+import pandas as pd
+
+import instrument
+
+# Minimal DAG executor with a content-addressed, size-bounded stage cache.
+#
+# Each node declares the nodes it depends on and the parameter sets it reads.
+# A node's cache key is a hash of its name, its function's source, the source
+# of the functions it declares as code, its parameters and its inputs'
+# fingerprints; a source frame's fingerprint is a hash of its contents, and a
+# computed node's fingerprint is its cache key.
+# Changing one node's parameters therefore only invalidates that node and
+# whatever depends on it.
+
+DEFAULT_CACHE_DIR = '.pipeline_cache'
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+
+class Node:
+    """A pipeline step: ``func(*deps)`` keyed by ``params`` for caching.
+
+    ``params`` is the configuration the function reads (weights, rule
+    tables); it is hashed into the cache key and must have a stable repr.
+    ``code`` lists the functions ``func`` calls into; editing any of their
+    source invalidates the cache. List only what the node runs, so editing
+    another stage's helper or config leaves this node cached.
+    """
+
+    def __init__(self, name, func, deps=(), params=None, code=()):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.params = params or {}
+        self.code = [func, *code]
+
+
+def hash_parts(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def fingerprint_frame(df):
+    """Content hash of a DataFrame (values, column names and dtypes)."""
+    values = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hash_parts(list(df.columns), [str(t) for t in df.dtypes], values.tobytes())
+
+
+def source_hash(code):
+    """Hash of a function's or module's source."""
+    try:
+        return hash_parts(inspect.getsource(code))
+    except (OSError, TypeError):
+        return hash_parts(getattr(code, '__qualname__', repr(code)))
+
+
+class StageCache:
+    """Pickled node outputs under ``directory``, evicted least-recently-used.
+
+    File mtimes record last use; after every write the oldest entries are
+    removed until the directory fits in ``max_bytes``.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+        """(True, value) on a hit, (False, None) on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False, None
+        os.utime(path)
+        return True, value
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                st = os.stat(os.path.join(self.directory, name))
+                entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+
+class Pipeline:
+    def __init__(self, nodes, cache=None):
+        self.nodes = {node.name: node for node in nodes}
+        self.cache = cache
+
+    def _closure(self, targets):
+        """Targets plus all their transitive dependencies, in topological order."""
+        ordered, seen = [], set()
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            for dep in self.nodes[name].deps if name in self.nodes else []:
+                visit(dep)
+            ordered.append(name)
+
+        for name in targets:
+            visit(name)
+        return ordered
+
+    def run(self, sources, targets=None, force=(), on_error=None):
+        """Evaluate ``targets`` (default: every node) given source frames.
+
+        ``sources`` maps source names to frames. Nodes named in ``force`` are
+        recomputed even on a cache hit. Returns (results, report) where
+        report rows are dicts of node, status (hit/miss/forced/failed/skipped)
+        and seconds. Failed nodes call ``on_error(name, exc)`` and their
+        dependents are skipped.
+        """
+        fingerprints = {name: fingerprint_frame(df) for name, df in sources.items()}
+        results = dict(sources)
+        report = []
+
+        for name in self._closure(targets or list(self.nodes)):
+            if name in sources:
+                continue
+            if name not in self.nodes:
+                raise KeyError(f"Unknown pipeline node or source '{name}'")
+            node = self.nodes[name]
+            if any(dep not in results for dep in node.deps):
+                report.append({'node': name, 'status': 'skipped', 'seconds': 0.0})
+                continue
+
+            key = hash_parts(name, *[source_hash(f) for f in node.code], repr(sorted(node.params.items())),
+                       *[fingerprints[dep] for dep in node.deps])
+            start = time.perf_counter()
+            try:
+                with instrument.stage(name) as record:
+                    hit, value = self._evaluate(node, key, results, force)
+                    record['cache'] = 'hit' if hit else 'miss'
+                    record['rows_in'] = sum(len(results[dep]) for dep in node.deps if hasattr(results[dep], '__len__'))
+                    record['rows_out'] = len(value) if hasattr(value, '__len__') else 0
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(name, e)
+                report.append({'node': name, 'status': 'failed', 'seconds': time.perf_counter() - start})
+                continue
+
+            results[name] = value
+            fingerprints[name] = key
+            status = 'hit' if hit else ('forced' if name in force else 'miss')
+            report.append({'node': name, 'status': status, 'seconds': time.perf_counter() - start})
+        return results, report
+
+    def _evaluate(self, node, key, results, force):
+        """(hit, value) for one node: from the cache when allowed, else computed and stored."""
+        if self.cache is not None and node.name not in force:
+            hit, value = self.cache.get(key)
+            if hit:
+                return True, value
+        value = node.func(*[results[dep] for dep in node.deps])
+        if self.cache is not None:
+            self.cache.put(key, value)
+        return False, value
+
+
+def format_report(report):
+    lines = ["Stage cache report:"]
+    for row in report:
+        lines.append(f"  {row['node']:<18} {row['status']:<8} {row['seconds']:.3f}s")
+    hits = sum(row['status'] == 'hit' for row in report)
+    lines.append(f"  {hits}/{len(report)} nodes served from cache")
+    return "\n".join(lines)
@@ -0,0 +1,163 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import keys
+import stages
+
+# Stage 07: next-k-month demand forecasts per district and service category.
+#
+# Each category's district_monthly rows become a (districts x months) matrix
+# (stages.series_matrix: NaN before a district's first recorded month, 0 for
+# later months with no rows), and the three matrices are stacked so every model runs once over all
+# series as array operations:
+#   - seasonal naive: the same month one season (12 months) earlier
+#   - simple exponential smoothing: alpha picked per series from a grid by
+#     one-step-ahead squared error, all alphas smoothed in the same pass
+#   - linear trend: least-squares line through the observed months
+# Per series, the model with the lowest error over a held-out tail is used.
+# Forecast totals are appended to each district's combined monthly history
+# and run through stage 03 to give the projected pressure index and tier.
+
+FORECAST_HORIZON = 3
+SEASON = 12
+ALPHAS = np.linspace(0.1, 0.9, 9)
+MODELS = ['seasonal_naive', 'exp_smoothing', 'linear_trend']
+OUT_07_COLS = stages.MONTH_KEYS + ['horizon'] + [f'{c}_forecast' for c in stages.CATEGORIES] + [
+    'total_forecast', 'projected_pressure_index', 'projected_tier']
+
+
+def _last(y):
+    return y[:, -1] if y.shape[1] else np.full(len(y), np.nan)
+
+
+def seasonal_naive(y, horizon):
+    if y.shape[1] < SEASON:
+        return np.repeat(_last(y)[:, None], horizon, axis=1)
+    lagged = y[:, y.shape[1] - SEASON + np.arange(horizon) % SEASON]
+    return np.where(np.isnan(lagged), _last(y)[:, None], lagged)
+
+
+def exp_smoothing(y, horizon):
+    """Flat forecast at the final smoothed level, alpha chosen per series."""
+    n = len(y)
+    level = np.full((n, len(ALPHAS)), np.nan)
+    sse = np.zeros((n, len(ALPHAS)))
+    for t in range(y.shape[1]):
+        x = y[:, t:t + 1]
+        started = ~np.isnan(level)
+        sse += np.where(started & ~np.isnan(x), (x - level) ** 2, 0)
+        # Missing months carry the level over
+        level = np.where(started, np.where(np.isnan(x), level, ALPHAS * x + (1 - ALPHAS) * level), x)
+        level = np.where(np.isnan(level), x, level)
+    best = sse.argmin(axis=1)
+    return np.repeat(level[np.arange(n), best][:, None], horizon, axis=1)
+
+
+def linear_trend(y, horizon):
+    valid = ~np.isnan(y)
+    t = np.arange(y.shape[1], dtype=float)
+    count = valid.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_mean = (valid * t).sum(axis=1) / count
+        y_mean = np.where(valid, y, 0).sum(axis=1) / count
+        dt = np.where(valid, t - t_mean[:, None], 0)
+        slope = (dt * np.where(valid, y - y_mean[:, None], 0)).sum(axis=1) / (dt ** 2).sum(axis=1)
+    slope = np.where(count >= 2, slope, 0)
+    ahead = y.shape[1] - 1 + np.arange(1, horizon + 1)
+    return y_mean[:, None] + slope[:, None] * (ahead - t_mean[:, None])
+
+
+MODEL_FUNCS = dict(zip(MODELS, [seasonal_naive, exp_smoothing, linear_trend]))
+
+
+def model_forecasts(y, horizon):
+    """(models x series x horizon) forecasts, clipped at zero."""
+    return np.maximum(np.stack([MODEL_FUNCS[m](y, horizon) for m in MODELS]), 0)
+
+
+def select_models(y, holdout):
+    """Per series, the index of the model with the lowest MAE over the last ``holdout`` months."""
+    if holdout < 1 or y.shape[1] <= holdout:
+        return np.full(len(y), MODELS.index('exp_smoothing'))
+    actual = y[:, -holdout:]
+    with warnings.catch_warnings():
+        # Series with no history in the holdout window have no error ("mean of empty slice")
+        warnings.simplefilter('ignore', RuntimeWarning)
+        errors = np.nanmean(np.abs(model_forecasts(y[:, :-holdout], holdout) - actual), axis=2)
+    return np.where(np.isnan(errors), np.inf, errors).argmin(axis=0)
+
+
+def forecast(y, horizon, holdout=None):
+    """(forecasts (series x horizon), chosen model index per series)."""
+    holdout = min(horizon, y.shape[1] // 3) if holdout is None else holdout
+    choice = select_models(y, holdout)
+    return model_forecasts(y, horizon)[choice, np.arange(len(y))], choice
+
+
+def forecast_stage(df_enroll, df_bio, df_demo, district_monthly):
+    """Stage 07: per-district category forecasts with projected pressure index and tier."""
+    frames = dict(zip(stages.CATEGORIES, [df_enroll, df_bio, df_demo]))
+    months = np.concatenate([df[keys.MONTH_ID].to_numpy() for df in frames.values()]).astype(np.intp)
+    n_series = int(district_monthly[keys.ID].max()) + 1
+    first, last = months.min(), months.max()
+
+    stacked = np.concatenate([stages.series_matrix(frames[c], n_series, first, last - first + 1) for c in stages.CATEGORIES])
+    predicted, _ = forecast(stacked, FORECAST_HORIZON)
+    predicted = np.nan_to_num(predicted).reshape(len(stages.CATEGORIES), n_series, FORECAST_HORIZON)
+
+    districts = np.unique(district_monthly[keys.ID].to_numpy())
+    out = pd.DataFrame({
+        keys.ID: np.repeat(districts, FORECAST_HORIZON).astype(np.int32),
+        keys.MONTH_ID: np.tile(last + np.arange(1, FORECAST_HORIZON + 1), len(districts)).astype(np.int16),
+        'horizon': np.tile(np.arange(1, FORECAST_HORIZON + 1), len(districts)),
+    })
+    for i, category in enumerate(stages.CATEGORIES):
+        out[f'{category}_forecast'] = predicted[i][districts].ravel()
+    out['total_forecast'] = out[[f'{c}_forecast' for c in stages.CATEGORIES]].sum(axis=1)
+
+    # Stage 03 over history + forecast months gives the projected pressure. Like
+    # district_monthly, which has no rows for months without demand, months
+    # forecast at zero are left out (a 0 -> x month would be infinite growth).
+    future = out.loc[out['total_forecast'] > 0, stages.MONTH_KEYS + ['total_forecast']].rename(
+        columns={'total_forecast': 'total'})
+    projected = stages.pressure_index(stages.district_metrics(pd.concat([district_monthly, future], ignore_index=True)))
+    projected = projected[stages.KEYS + ['pressure_index', 'pressure_tier']].rename(
+        columns={'pressure_index': 'projected_pressure_index', 'pressure_tier': 'projected_tier'})
+    return keys.join(out, projected)[OUT_07_COLS]
+
+
+def backtest(y, horizon, origins):
+    """Accuracy of each model and of per-series selection over rolling forecast origins.
+
+    For each of the last ``origins`` cut points, models are fit on the
+    months before it and scored on the next ``horizon`` months. Returns a
+    frame of MAE, sMAPE (%) and scored points per method.
+    """
+    errors = {m: [] for m in MODELS + ['selected']}
+    actuals = []
+    for origin in range(y.shape[1] - horizon - origins + 1, y.shape[1] - horizon + 1):
+        if origin < 2:
+            continue
+        train, actual = y[:, :origin], y[:, origin:origin + horizon]
+        by_model = model_forecasts(train, horizon)
+        choice = select_models(train, min(horizon, origin // 3))
+        for i, m in enumerate(MODELS):
+            errors[m].append(by_model[i])
+        errors['selected'].append(by_model[choice, np.arange(len(y))])
+        actuals.append(actual)
+    if not actuals:
+        raise ValueError(f"History of {y.shape[1]} months is too short to backtest a {horizon}-month horizon")
+
+    actual = np.concatenate(actuals, axis=1)
+    rows = []
+    for method, forecasts in errors.items():
+        predicted = np.concatenate(forecasts, axis=1)
+        scored = ~np.isnan(actual) & ~np.isnan(predicted)
+        diff = np.abs(predicted - actual)[scored]
+        denom = (np.abs(predicted) + np.abs(actual))[scored]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            smape = np.where(denom > 0, 2 * diff / denom, 0)
+        rows.append({'method': method, 'mae': diff.mean(), 'smape_pct': 100 * smape.mean(), 'points': int(scored.sum())})
+    return pd.DataFrame(rows)
@@ -0,0 +1,298 @@
+import argparse
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import instrument
+import keys
+import stages
+import storage
+warnings.filterwarnings('ignore')
+
+# Incremental month-by-month refresh of the stage 02-06 outputs.
+#
+# Instead of recomputing from the full district_monthly history, a per-district
+# running state is kept in the `pipeline_state` table:
+#   - per-category volume sums (+ whether the category has been seen)
+#   - age band sums and total volume
+#   - Welford count / mean / M2 of monthly totals (volatility = sample std)
+#   - last monthly total and the running sum/count of month-on-month pct changes
+# Applying a new month only touches that month's rows. The combined monthly
+# totals are also kept in `pipeline_history`, which stage 05 needs because
+# every past month is re-tested against the updated mean + 2*std threshold.
+# An update also appends the new month's rows to the working directory's
+# district_monthly tables, so they stay the full history that run_pipeline
+# and --verify read.
+#
+# Updates only write what changed (see storage.append_table): the new rows of
+# the district_monthly tables and of `pipeline_history`, and the state rows of
+# the districts that reported. Loading the state keeps each district's latest
+# row; once superseded rows outnumber live ones the state is rewritten whole.
+
+STATE_TABLE = 'pipeline_state'
+HISTORY_TABLE = 'pipeline_history'
+
+CATEGORY_TABLES = {
+    'enrollment': 'district_monthly_enrollment',
+    'biometric': 'district_monthly_biometric',
+    'demographic': 'district_monthly_demographic'
+}
+
+COUNT_COLS = [f'{c}_vol' for c in stages.CATEGORIES] + stages.AGE_COLS + ['total']
+SEEN_COLS = [f'has_{c}' for c in stages.CATEGORIES]
+STATE_COLS = keys.NAME_KEYS + COUNT_COLS + SEEN_COLS + ['n_months', 'mean', 'm2', 'last_total', 'pct_sum', 'pct_count', 'last_month']
+
+
+def empty_state():
+    state = pd.DataFrame({c: pd.Series(dtype='int64') for c in STATE_COLS})
+    state[keys.NAME_KEYS + ['last_month']] = state[keys.NAME_KEYS + ['last_month']].astype(object)
+    state[SEEN_COLS] = state[SEEN_COLS].astype(bool)
+    state[['mean', 'm2', 'last_total', 'pct_sum']] = state[['mean', 'm2', 'last_total', 'pct_sum']].astype(float)
+    return state
+
+
+def empty_history():
+    return pd.DataFrame({'state': pd.Series(dtype=object), 'district': pd.Series(dtype=object),
+                         'month': pd.Series(dtype=object), 'total': pd.Series(dtype='int64')})
+
+
+def month_aggregates(frames):
+    """Per-district aggregates of one month's district_monthly rows, keyed by category."""
+    parts = []
+    for category, df in frames.items():
+        part = df.groupby(keys.NAME_KEYS)[stages.AGE_COLS + ['total']].sum()
+        part[f'{category}_vol'] = part['total']
+        part[f'has_{category}'] = True
+        parts.append(part)
+    month = pd.concat(parts).groupby(level=[0, 1]).sum()
+    count_dtype = np.result_type(*[df['total'].dtype for df in frames.values()])
+    for col in COUNT_COLS:
+        month[col] = month[col].astype(count_dtype) if col in month else count_dtype.type(0)
+    for col in SEEN_COLS:
+        month[col] = month[col].fillna(False).astype(bool) if col in month else False
+    return month.reset_index()
+
+
+def apply_month(state, frames):
+    """Fold one month of district_monthly rows into the running state.
+
+    ``frames`` maps category name to that category's rows for a single month,
+    which must be later than every month already applied. Returns the new
+    state and the month's history rows.
+    """
+    months = pd.unique(pd.concat([df['month'] for df in frames.values()]))
+    if len(months) != 1:
+        raise ValueError(f"apply_month expects exactly one month, got {list(months)}")
+    month = months[0]
+    if len(state) and month <= state['last_month'].max():
+        raise ValueError(f"Month {month} is not after the last applied month {state['last_month'].max()}")
+
+    new = month_aggregates(frames)
+    merged = state.merge(new, on=keys.NAME_KEYS, how='outer', suffixes=('', '_new'), sort=True)
+    arrived = merged['total_new'].notna().to_numpy()
+
+    for col in COUNT_COLS:
+        dtype = np.result_type(state[col].dtype, new[col].dtype) if len(state) else new[col].dtype
+        merged[col] = (merged[col].fillna(0) + merged[f'{col}_new'].fillna(0)).astype(dtype)
+    for col in SEEN_COLS:
+        merged[col] = merged[col].fillna(False).astype(bool) | merged[f'{col}_new'].fillna(False).astype(bool)
+
+    # Welford update of the monthly-total moments
+    x = merged['total_new'].to_numpy(dtype=float)
+    n = merged['n_months'].fillna(0).to_numpy(dtype='int64')
+    mean = merged['mean'].fillna(0).to_numpy(dtype=float)
+    m2 = merged['m2'].fillna(0).to_numpy(dtype=float)
+    last = merged['last_total'].to_numpy(dtype=float)
+    n_new = n + 1
+    delta = x - mean
+    mean_new = mean + delta / n_new
+    m2_new = m2 + delta * (x - mean_new)
+
+    # Month-on-month pct change, as Series.pct_change (x / last - 1) skipping NaN
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = x / last - 1
+    has_pct = arrived & (n > 0) & ~np.isnan(pct)
+    pct_sum = merged['pct_sum'].fillna(0).to_numpy(dtype=float)
+    pct_count = merged['pct_count'].fillna(0).to_numpy(dtype='int64')
+
+    merged['n_months'] = np.where(arrived, n_new, n)
+    merged['mean'] = np.where(arrived, mean_new, mean)
+    merged['m2'] = np.where(arrived, m2_new, m2)
+    merged['last_total'] = np.where(arrived, x, last)
+    merged['pct_sum'] = np.where(has_pct, pct_sum + pct, pct_sum)
+    merged['pct_count'] = np.where(has_pct, pct_count + 1, pct_count)
+    merged['last_month'] = np.where(arrived, month, merged['last_month'])
+
+    rows = merged.loc[arrived, keys.NAME_KEYS + ['total_new']].rename(columns={'total_new': 'total'})
+    rows.insert(2, 'month', month)
+    rows['total'] = rows['total'].astype(merged['total'].dtype)
+    return merged[STATE_COLS], rows.reset_index(drop=True)
+
+
+def apply_frames(state, frames):
+    """Apply every month present in ``frames`` in chronological order.
+
+    Returns the new state and the history rows of the applied months.
+    """
+    months = sorted(pd.unique(pd.concat([df['month'] for df in frames.values()])))
+    rows = []
+    for month in months:
+        month_frames = {c: df[df['month'] == month] for c, df in frames.items()}
+        with instrument.stage(f"incremental.apply.{month}") as record:
+            record['rows_in'] = sum(len(df) for df in month_frames.values())
+            state, month_rows = apply_month(state, month_frames)
+            rows.append(month_rows)
+            record['rows_out'] = len(state)
+    return state, pd.concat(rows, ignore_index=True) if rows else empty_history()
+
+
+def state_metrics(state):
+    """Stage 03 inputs (total_volume, volatility, monthly_growth_rate) from an encoded running state."""
+    metrics = state[stages.KEYS].copy()
+    metrics['total_volume'] = state['total']
+    n = state['n_months'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics['volatility'] = np.where(n > 1, np.sqrt(state['m2'] / (n - 1)), np.nan)
+        growth = state['pct_sum'] / state['pct_count']
+    metrics['monthly_growth_rate'] = growth.where(n >= 2).fillna(0)
+    return metrics
+
+
+def decode_outputs(index, outputs):
+    return {name: index.decode(df) for name, df in outputs.items()}
+
+
+def emit_outputs(state, history):
+    """Stage 02-06 output frames (unrounded) from the running state."""
+    index = keys.DistrictIndex.from_frames([state])
+    state, history = index.encode(state), index.encode(history)
+    vols = [state.loc[state[f'has_{c}'], stages.KEYS + [f'{c}_vol']].reset_index(drop=True) for c in stages.CATEGORIES]
+    master = stages.decompose_demand(*vols)
+    metrics = stages.pressure_index(state_metrics(state))
+    age_sum = state[stages.KEYS + stages.AGE_COLS + ['total']]
+    out_04 = stages.demand_typology(age_sum, metrics, master)[stages.OUT_04_COLS]
+    return decode_outputs(index, {
+        '02_output': master[stages.OUT_02_COLS],
+        '03_output': metrics[stages.OUT_03_COLS],
+        '04_output': out_04,
+        '05_output': stages.detect_spikes(history),
+        '06_output': stages.policy_recommendations(out_04, metrics, master),
+    })
+
+
+def full_outputs(frames):
+    """Stage 02-06 output frames recomputed from the full history, as run_pipeline does."""
+    index = keys.DistrictIndex.from_frames(frames.values())
+    frames = {c: index.encode(df) for c, df in frames.items()}
+    master = stages.decompose_demand(*[stages.category_volume(frames[c], c) for c in stages.CATEGORIES])
+    df_all = pd.concat([frames['enrollment'], frames['biometric'], frames['demographic']])
+    district_monthly = stages.monthly_totals(df_all)
+    metrics = stages.pressure_index(stages.district_metrics(district_monthly))
+    out_04 = stages.demand_typology(stages.age_sums(df_all), metrics, master)[stages.OUT_04_COLS]
+    return decode_outputs(index, {
+        '02_output': master[stages.OUT_02_COLS],
+        '03_output': metrics[stages.OUT_03_COLS],
+        '04_output': out_04,
+        '05_output': stages.detect_spikes(district_monthly),
+        '06_output': stages.policy_recommendations(out_04, metrics, master),
+    })
+
+
+def compare_outputs(incremental, full, rtol=1e-9, atol=1e-9):
+    """List of mismatch descriptions between two sets of output frames."""
+    problems = []
+    for name, expected in full.items():
+        got = incremental[name].reset_index(drop=True)
+        expected = expected.reset_index(drop=True)
+        if list(got.columns) != list(expected.columns) or len(got) != len(expected):
+            problems.append(f"{name}: shape/columns differ {got.shape} vs {expected.shape}")
+            continue
+        for col in expected.columns:
+            if pd.api.types.is_numeric_dtype(expected[col]):
+                ok = np.isclose(got[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float),
+                                rtol=rtol, atol=atol, equal_nan=True)
+            else:
+                ok = got[col].astype(object).to_numpy() == expected[col].astype(object).to_numpy()
+            if not ok.all():
+                problems.append(f"{name}.{col}: {int((~ok).sum())} rows differ")
+    return problems
+
+
+def write_outputs(outputs):
+    for name, df in outputs.items():
+        if name == '05_output' and df.empty:
+            print("No spikes detected.")
+            continue
+        path = storage.write_table(df if name == '06_output' else df.round(3), name, storage.OUTPUT_FORMAT)
+        print(f"Saved {path}")
+
+
+def load_frames(directory=""):
+    return {c: storage.read_table(t, directory=directory) for c, t in CATEGORY_TABLES.items()}
+
+
+def load_state():
+    """(state, history, stored state rows) from the working directory, empty if there is none yet."""
+    try:
+        stored = storage.read_table(STATE_TABLE)
+        history = storage.read_table(HISTORY_TABLE)
+    except FileNotFoundError:
+        return empty_state(), empty_history(), 0
+    state = stored.drop_duplicates(keys.NAME_KEYS, keep='last').sort_values(keys.NAME_KEYS, ignore_index=True)
+    return state, history, len(stored)
+
+
+def save_update(state, stored_rows, new_frames, new_history):
+    """Append an update's rows to the district_monthly, history and state tables."""
+    for category, table in CATEGORY_TABLES.items():
+        storage.append_table(new_frames[category], table)
+    storage.append_table(new_history, HISTORY_TABLE)
+    changed = state[state['last_month'].isin(pd.unique(new_history['month']))]
+    if stored_rows + len(changed) > 2 * len(state):
+        storage.write_table(state, STATE_TABLE)
+    else:
+        storage.append_table(changed, STATE_TABLE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally refresh pipeline outputs 02-06 one month at a time")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--init', action='store_true',
+                      help="rebuild the running state from the district_monthly tables in the working directory")
+    mode.add_argument('--update', metavar='DIR',
+                      help="apply the new month(s) of district_monthly tables found in DIR")
+    parser.add_argument('--verify', action='store_true',
+                        help="check the results against a full recompute over the district_monthly history")
+    args = parser.parse_args()
+
+    try:
+        if args.init:
+            state, history = apply_frames(empty_state(), load_frames())
+        else:
+            new_frames = load_frames(args.update)
+            state, history, stored_rows = load_state()
+            state, new_history = apply_frames(state, new_frames)
+    except ValueError as e:
+        print(f"Update aborted, nothing was written: {e}")
+        raise SystemExit(1)
+
+    if args.init:
+        storage.write_table(state, STATE_TABLE)
+        storage.write_table(history, HISTORY_TABLE)
+    else:
+        save_update(state, stored_rows, new_frames, new_history)
+        history = pd.concat([history, new_history], ignore_index=True)
+    print(f"State covers {len(state)} districts up to {state['last_month'].max()}")
+
+    outputs = emit_outputs(state, history)
+    write_outputs(outputs)
+
+    if args.verify:
+        problems = compare_outputs(outputs, full_outputs(load_frames()))
+        if problems:
+            print("Verification FAILED:")
+            for problem in problems:
+                print(f"  {problem}")
+            raise SystemExit(1)
+        print("Verification passed: incremental outputs match a full recompute.")
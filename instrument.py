@@ -0,0 +1,163 @@
+import argparse
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Stage-level instrumentation for run_01_prep, run_pipeline and run_visuals.
+#
+# Wrap a unit of work in `with instrument.stage('03'):` to record wall time,
+# CPU time, peak RSS growth, rows in/out and bytes read/written. storage.py
+# reports table reads and writes to the innermost active stage; other code
+# calls instrument.count(). One JSON line per stage is appended to
+# $AADHAAR_METRICS (default pipeline_metrics.jsonl, empty string disables).
+# Setting $AADHAAR_PROFILE_DIR also dumps a cProfile .pstats file per stage;
+# only outermost stages are profiled (one profiler can be active at a time),
+# so a nested stage's calls appear in its enclosing stage's profile.
+#
+#   python instrument.py            # compare the latest run with earlier ones
+
+DEFAULT_METRICS_FILE = 'pipeline_metrics.jsonl'
+
+RUN_ID = os.environ.get('AADHAAR_RUN_ID') or f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{os.getpid()}"
+# Worker processes inherit the parent's run id
+os.environ['AADHAAR_RUN_ID'] = RUN_ID
+
+_active = []
+
+
+def metrics_path():
+    return os.environ.get('AADHAAR_METRICS', DEFAULT_METRICS_FILE)
+
+
+def _peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def count(rows_in=0, rows_out=0, bytes_read=0, bytes_written=0):
+    """Add row and byte counts to the innermost active stage, if any."""
+    if not _active:
+        return
+    record = _active[-1]
+    record['rows_in'] += rows_in
+    record['rows_out'] += rows_out
+    record['bytes_read'] += bytes_read
+    record['bytes_written'] += bytes_written
+
+
+def emit(record):
+    path = metrics_path()
+    if not path:
+        return
+    # One short write per record, so concurrent worker processes do not interleave lines
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+@contextmanager
+def stage(name, **fields):
+    """Measure the enclosed block as stage ``name``; extra fields are recorded as-is.
+
+    Yields the record dict so callers can set counts or fields directly.
+    """
+    record = {
+        'run_id': RUN_ID,
+        'script': os.path.basename(sys.argv[0]),
+        'stage': name,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+        'rows_in': 0, 'rows_out': 0, 'bytes_read': 0, 'bytes_written': 0,
+        **fields,
+    }
+    profile_dir = os.environ.get('AADHAAR_PROFILE_DIR')
+    profiler = cProfile.Profile() if profile_dir and not _active else None
+
+    rss_before = _peak_rss_kb()
+    wall, cpu = time.perf_counter(), time.process_time()
+    _active.append(record)
+    if profiler:
+        profiler.enable()
+    try:
+        yield record
+        record.setdefault('status', 'ok')
+    except BaseException as e:
+        record['status'] = 'error'
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        _active.pop()
+        record['wall_s'] = round(time.perf_counter() - wall, 6)
+        record['cpu_s'] = round(time.process_time() - cpu, 6)
+        peak = _peak_rss_kb()
+        record['peak_rss_kb'] = peak
+        record['peak_rss_delta_kb'] = peak - rss_before
+        if profiler:
+            os.makedirs(profile_dir, exist_ok=True)
+            safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+            profiler.dump_stats(os.path.join(profile_dir, f"{RUN_ID}_{safe}.pstats"))
+        emit(record)
+
+
+def load_runs(path):
+    """Records grouped by run id, in file order."""
+    runs = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                runs.setdefault(record['run_id'], []).append(record)
+    return runs
+
+
+def compare(path, baseline_runs=5, threshold=0.2, min_delta=0.05):
+    """Print each script's latest run, stage by stage, against the median of its earlier runs.
+
+    A stage is flagged when it is slower than its baseline by more than
+    ``threshold`` (a fraction) and by at least ``min_delta`` seconds, so
+    millisecond stages do not flag on timer noise.
+    """
+    import statistics
+
+    runs = load_runs(path)
+    if not runs:
+        print(f"No runs recorded in {path}")
+        return
+    by_script = {}
+    for run_id, records in runs.items():
+        for script in dict.fromkeys(r['script'] for r in records):
+            by_script.setdefault(script, []).append([r for r in records if r['script'] == script])
+
+    for script, script_runs in by_script.items():
+        latest, earlier = script_runs[-1], script_runs[-1 - baseline_runs:-1]
+        history = {}
+        for records in earlier:
+            for record in records:
+                history.setdefault(record['stage'], []).append(record['wall_s'])
+
+        print(f"{script}: run {latest[0]['run_id']} vs median of {len(earlier)} earlier run(s)")
+        print(f"  {'stage':<40} {'wall_s':>9} {'baseline':>9} {'change':>8} {'rows_in':>9} {'rows_out':>9} {'rss_delta_kb':>13}")
+        for record in latest:
+            past = history.get(record['stage'])
+            base = statistics.median(past) if past else float('nan')
+            change = record['wall_s'] / base - 1 if past and base else float('nan')
+            flag = '  REGRESSED' if change > threshold and record['wall_s'] - base >= min_delta else ''
+            print(f"  {record['stage']:<40} {record['wall_s']:>9.3f} {base:>9.3f} {change * 100:>7.1f}% "
+                  f"{record['rows_in']:>9} {record['rows_out']:>9} {record['peak_rss_delta_kb']:>13}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the latest instrumented run with earlier runs")
+    parser.add_argument('path', nargs='?', default=metrics_path() or DEFAULT_METRICS_FILE)
+    parser.add_argument('--baseline-runs', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.2, help="flag stages slower than baseline by this fraction")
+    parser.add_argument('--min-delta', type=float, default=0.05,
+                        help="only flag stages that are also at least this many seconds slower")
+    args = parser.parse_args()
+    compare(args.path, args.baseline_runs, args.threshold, args.min_delta)
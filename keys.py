@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# Integer-coded district and month keys for stages 02-06.
+#
+# A DistrictIndex is built once from the district_monthly inputs and maps each
+# (state, district) pair to a dense int32 district_id, numbered in sorted
+# (state, district) order so that grouping by id orders rows exactly as
+# grouping by the names did. Months become int16 period ordinals (months
+# since 1970-01), which sort chronologically like the '%Y-%m' strings and
+# need no index to decode. Intermediate frames carry only these codes and are
+# joined with join() by direct array lookup; names are decoded when outputs
+# are written.
+
+ID = 'district_id'
+MONTH_ID = 'month_id'
+NAME_KEYS = ['state', 'district']
+
+
+def month_ordinals(months):
+    """int16 period ordinals for '%Y-%m' month labels (parsed once per distinct month)."""
+    codes, uniques = pd.factorize(pd.Series(months).astype(str), use_na_sentinel=False)
+    ordinals = pd.PeriodIndex(uniques, freq='M').asi8.astype(np.int16)
+    return ordinals[codes]
+
+
+def month_labels(ordinals):
+    """'%Y-%m' labels (object array) for int16 period ordinals."""
+    codes, uniques = pd.factorize(np.asarray(ordinals), use_na_sentinel=False)
+    labels = pd.PeriodIndex.from_ordinals(uniques.astype(np.int64), freq='M').strftime('%Y-%m').to_numpy(dtype=object)
+    return labels[codes]
+
+
+class DistrictIndex:
+    """Dense int32 ids for every (state, district) pair in a set of frames."""
+
+    def __init__(self, names):
+        self.names = names.reset_index(drop=True)
+        self._lookup = pd.MultiIndex.from_frame(self.names)
+
+    @classmethod
+    def from_frames(cls, frames):
+        pairs = pd.concat([df[NAME_KEYS].drop_duplicates() for df in frames], ignore_index=True)
+        return cls(pairs.drop_duplicates().sort_values(NAME_KEYS, kind='stable'))
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, df):
+        """district_id of each row of ``df``, -1 where the pair is not indexed."""
+        rows = pd.MultiIndex.from_arrays([df[c] for c in NAME_KEYS])
+        return self._lookup.get_indexer(rows).astype(np.int32)
+
+    def encode(self, df):
+        """``df`` with state/district (and month) replaced by district_id (and month_id)."""
+        ids = self.lookup(df)
+        if (ids < 0).any():
+            raise KeyError(f"{int((ids < 0).sum())} rows have a (state, district) missing from the index")
+        dropped = NAME_KEYS + (['month'] if 'month' in df.columns else [])
+        out = df.drop(columns=dropped)
+        if 'month' in df.columns:
+            out.insert(0, MONTH_ID, month_ordinals(df['month']))
+        out.insert(0, ID, ids)
+        return out
+
+    def decode(self, df):
+        """Inverse of encode(): state, district (and month) names in place of the codes."""
+        ids = df[ID].to_numpy().astype(np.intp)
+        out = df.drop(columns=[c for c in (ID, MONTH_ID) if c in df.columns])
+        if MONTH_ID in df.columns:
+            out.insert(0, 'month', month_labels(df[MONTH_ID]))
+        for position, col in enumerate(NAME_KEYS):
+            out.insert(position, col, self.names[col].to_numpy()[ids])
+        return out
+
+
+def join(left, right):
+    """Add ``right``'s columns to ``left`` by district_id, keeping only matched rows.
+
+    Equivalent to ``left.merge(right, on='district_id')`` when ``right`` has
+    one row per district and no other shared columns: left's row order is
+    kept and the result has a fresh RangeIndex. The match is a direct lookup
+    in an id-indexed position array rather than a hash join.
+    """
+    left_ids = left[ID].to_numpy()
+    right_ids = right[ID].to_numpy()
+    position = np.full(int(max(left_ids.max(initial=-1), right_ids.max(initial=-1))) + 1, -1, dtype=np.intp)
+    position[right_ids] = np.arange(len(right_ids))
+    take = position[left_ids]
+    matched = take >= 0
+
+    out = left[matched].reset_index(drop=True)
+    take = take[matched]
+    for col in right.columns:
+        if col != ID:
+            out[col] = right[col].iloc[take].reset_index(drop=True)
+    return out
@@ -0,0 +1,145 @@
+import argparse
+import os
+
+import pandas as pd
+
+import instrument
+import keys
+import spikes
+import stages
+import storage
+
+# Out-of-core backend for stages 02-06 over district_monthly data partitioned
+# on disk by state as <root>/<table>/<state>.<ext>, rows in month order with
+# month as a column.
+#
+# Every stage 02-05 reduction is per district, and a district lives in one
+# state, so states are processed one at a time: each state's partitions are
+# reduced to per-district-month sums as soon as they are read, those totals
+# go through the same stages.py functions as the in-memory pipeline, and only
+# the per-district results are kept. The global steps (min-max normalization
+# in 03 and the 04/06 joins) then run on frames with one row per district.
+# Peak memory is one state's district x month rows, however many states
+# there are. Stage 07 needs every district's series at once and is not
+# supported by this backend.
+#
+#   python partitioned.py --root partitions      # partition the district_monthly tables
+#   python run_pipeline.py --backend partitioned --partition-dir partitions --verify
+
+CATEGORY_TABLES = {
+    'enrollment': 'district_monthly_enrollment',
+    'biometric': 'district_monthly_biometric',
+    'demographic': 'district_monthly_demographic'
+}
+VALUE_COLS = stages.AGE_COLS + ['total']
+# run_pipeline stages this backend does not produce
+UNSUPPORTED_STAGES = ['07']
+
+
+def write_partitions(df, root, table):
+    """Write ``df`` as one file per state under <root>/<table>/, sorted by month."""
+    directory = os.path.join(root, table)
+    os.makedirs(directory, exist_ok=True)
+    for state, part in df.groupby('state', sort=True):
+        storage.write_table(part.sort_values('month', kind='stable', ignore_index=True), state, directory=directory)
+
+
+def list_states(root):
+    states = set()
+    for table in CATEGORY_TABLES.values():
+        directory = os.path.join(root, table)
+        if os.path.isdir(directory):
+            states.update(os.path.splitext(f)[0] for f in os.listdir(directory)
+                          if os.path.splitext(f)[1] in storage.FORMAT_EXTENSIONS.values())
+    return sorted(states)
+
+
+def empty_monthly():
+    columns = {c: pd.Series(dtype=object) for c in keys.NAME_KEYS + ['month']}
+    columns.update({c: pd.Series(dtype='int64') for c in VALUE_COLS})
+    return pd.DataFrame(columns)
+
+
+def load_state(root, state):
+    """One state's district_monthly rows per category, reduced to one row per district and month."""
+    frames = {}
+    for category, table in CATEGORY_TABLES.items():
+        try:
+            df = storage.read_table(state, columns=['district', 'month'] + VALUE_COLS,
+                                    directory=os.path.join(root, table), decode=False)
+        except FileNotFoundError:
+            frames[category] = empty_monthly()
+            continue
+        # district_monthly partitions already hold one row per district and month; finer rows are summed
+        if df.duplicated(['district', 'month']).any():
+            df = df.groupby(['district', 'month'], sort=False, observed=True)[VALUE_COLS].sum().reset_index()
+        frame = storage.decode_frame(df)
+        frame.insert(0, 'state', state)
+        frames[category] = frame
+    return frames
+
+
+def state_results(frames):
+    """Per-district stage results for one state, keyed by names: master, metrics (unnormalized), age_sum, out_05, spikes."""
+    index = keys.DistrictIndex.from_frames(frames.values())
+    coded = {category: index.encode(df) for category, df in frames.items()}
+    master = stages.decompose_demand(*[stages.category_volume(coded[c], c) for c in stages.CATEGORIES])
+    df_all = pd.concat([coded[c] for c in stages.CATEGORIES])
+    district_monthly = stages.monthly_totals(df_all)
+    results = {
+        'master': master,
+        'metrics': stages.district_metrics(district_monthly),
+        'age_sum': stages.age_sums(df_all),
+        'out_05': stages.detect_spikes(district_monthly),
+        'spikes': spikes.spike_stage(*[coded[c] for c in stages.CATEGORIES], district_monthly),
+    }
+    return {name: index.decode(df) for name, df in results.items()}
+
+
+def run(root):
+    """Stage results (coded, as run_pipeline's DAG nodes) and their DistrictIndex, state by state."""
+    parts = {}
+    for state in list_states(root):
+        with instrument.stage(f"partitioned.{state}"):
+            for name, df in state_results(load_state(root, state)).items():
+                parts.setdefault(name, []).append(df)
+    if not parts:
+        raise FileNotFoundError(f"No partitions under {os.path.abspath(root)}")
+    return merge(parts)
+
+
+def merge(parts, bounds=None):
+    """Global stage steps over per-state results (name -> list of state_results frames).
+
+    Returns (coded results, DistrictIndex). Rows are put back in district_id
+    order, whatever order the states came in. ``bounds`` are the merged
+    stage 03 feature bounds when the caller already has them.
+    """
+    # States missing a category contribute empty frames; leave them out so dtypes stay numeric
+    frames = {name: pd.concat([df for df in dfs if len(df)] or dfs[:1], ignore_index=True) for name, dfs in parts.items()}
+    index = keys.DistrictIndex.from_frames([frames['metrics'], frames['master']])
+    coded = {name: index.encode(df).sort_values(keys.ID, kind='stable', ignore_index=True) for name, df in frames.items()}
+
+    metrics = stages.pressure_index(coded['metrics'], bounds)
+    out_04 = stages.demand_typology(coded['age_sum'], metrics, coded['master'])[stages.OUT_04_COLS]
+    results = {
+        'master': coded['master'],
+        'metrics': metrics,
+        'out_04': out_04,
+        'out_05': coded['out_05'],
+        'spikes': coded['spikes'].astype({'category': pd.CategoricalDtype(spikes.SERIES),
+                                          'baseline': pd.CategoricalDtype(spikes.BASELINES)})[spikes.SPIKE_COLS],
+        'out_06': stages.policy_recommendations(out_04, metrics, coded['master']),
+    }
+    return results, index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition the district_monthly tables by state")
+    parser.add_argument('--root', default='partitions', help="directory to write partitions under")
+    args = parser.parse_args()
+
+    for table in CATEGORY_TABLES.values():
+        df = storage.read_table(table)
+        write_partitions(df, args.root, table)
+        print(f"Partitioned {table}: {len(df)} rows into {args.root}/{table}/")
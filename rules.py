@@ -0,0 +1,137 @@
+import operator
+
+import numpy as np
+import pandas as pd
+
+# Declarative classification rules used by run_pipeline stages 02-06.
+#
+# A rule table is an ordered list of (label, conditions); the first rule whose
+# conditions all hold wins, otherwise the table's default applies. Conditions
+# are (column, op, value) triples, where value may be Col('other_column').
+# Tables are evaluated for every district at once with np.select, so the
+# thresholds live here as data instead of in per-row if-chains.
+
+
+class Col:
+    """Reference to another column as the right-hand side of a condition."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Col({self.name!r})"
+
+
+OPS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+}
+
+HIGH_STRESS_TIERS = ['High Stress', 'Critical Infrastructure Stress']
+
+# --- 02: Demand decomposition ---
+DOMINANT_TYPE_RULES = [
+    ('Enrollment', [('enrollment_ratio', '==', Col('dominance_score'))]),
+    ('Biometric', [('biometric_ratio', '==', Col('dominance_score'))]),
+]
+DOMINANT_TYPE_DEFAULT = 'Demographic'
+
+DOMINANCE_STRENGTH_RULES = [
+    ('Strong Dominant', [('dominance_score', '>=', 0.6)]),
+    ('Mixed Demand', [('dominance_score', '>=', 0.4)]),
+]
+DOMINANCE_STRENGTH_DEFAULT = 'Balanced Demand'
+
+OPERATIONAL_MEANING_RULES = [
+    ('New Population Entry', [('dominance_strength', '==', 'Strong Dominant'), ('dominant_type', '==', 'Enrollment')]),
+    ('Maintenance Burden', [('dominance_strength', '==', 'Strong Dominant'), ('dominant_type', '==', 'Biometric')]),
+]
+OPERATIONAL_MEANING_DEFAULT = 'General Service Load'
+
+# --- 03: Pressure index tiers ---
+PRESSURE_TIER_RULES = [
+    ('Critical Infrastructure Stress', [('pressure_index', '>=', 0.75)]),
+    ('High Stress', [('pressure_index', '>=', 0.55)]),
+    ('Moderate Stress', [('pressure_index', '>=', 0.35)]),
+]
+PRESSURE_TIER_DEFAULT = 'Stable'
+
+# --- 04: Operational typology ---
+TYPOLOGY_RULES = [
+    ('School-linked Surge Zone', [('child_ratio', '>', 0.6), ('pressure_tier', 'in', HIGH_STRESS_TIERS)]),
+    ('Correctional Overload Zone', [('adult_ratio', '>', 0.7), ('pressure_tier', 'in', HIGH_STRESS_TIERS)]),
+    ('Migration Impact Zone', [('dominant_type', '==', 'Biometric'), ('volatility', '>', 100)]),
+]
+TYPOLOGY_DEFAULT = 'Population Expansion Zone'
+
+# --- 06: Policy recommendations, labels are (recommended_action, rationale) ---
+RECOMMENDATION_RULES = [
+    (("Launch school-based biometric drives", "High child ratio indicates school admission season pressure."),
+     [('typology', '==', 'School-linked Surge Zone')]),
+    (("Set up temporary camps", "Adult dominance suggests high demand for updates."),
+     [('typology', '==', 'Correctional Overload Zone')]),
+    (("Set up temporary camps", "Critical stress levels require immediate capacity expansion."),
+     [('pressure_tier', '==', 'Critical Infrastructure Stress')]),
+    (("Increase biometric operators", "Biometric heavy load requires specialized operators."),
+     [('dominance_strength', '==', 'Strong Dominant'), ('dominant_type', '==', 'Biometric')]),
+]
+RECOMMENDATION_DEFAULT = ("Deploy mobile enrollment vans", "High adult correction load + volatility indicates migrant churn.")
+
+
+def _condition(df, column, op, value):
+    left = df[column]
+    if op == 'in':
+        return left.isin(value).to_numpy()
+    right = df[value.name].to_numpy() if isinstance(value, Col) else value
+    # NaN never satisfies a comparison, matching the scalar if-chains
+    return np.asarray(OPS[op](left.to_numpy(), right), dtype=bool)
+
+
+def rule_codes(df, rules):
+    """Index of the first matching rule per row, len(rules) where none match."""
+    conditions = []
+    for _, clauses in rules:
+        mask = np.ones(len(df), dtype=bool)
+        for column, op, value in clauses:
+            mask &= _condition(df, column, op, value)
+        conditions.append(mask)
+    return np.select(conditions, np.arange(len(rules)), default=len(rules))
+
+
+def apply_rules(df, rules, default):
+    """Label every row of ``df`` with the first matching rule's label."""
+    labels = np.empty(len(rules) + 1, dtype=object)
+    labels[:] = [label for label, _ in rules] + [default]
+    return labels[rule_codes(df, rules)]
+
+
+def classify_dominance(df):
+    """dominant_type and dominance_strength columns for stage 02."""
+    return (apply_rules(df, DOMINANT_TYPE_RULES, DOMINANT_TYPE_DEFAULT),
+            apply_rules(df, DOMINANCE_STRENGTH_RULES, DOMINANCE_STRENGTH_DEFAULT))
+
+
+def operational_meaning(df):
+    return apply_rules(df, OPERATIONAL_MEANING_RULES, OPERATIONAL_MEANING_DEFAULT)
+
+
+def classify_pressure(pressure_index):
+    """Pressure tier for a Series (or array) of pressure index values."""
+    frame = pd.DataFrame({'pressure_index': np.asarray(pressure_index, dtype=float)})
+    return apply_rules(frame, PRESSURE_TIER_RULES, PRESSURE_TIER_DEFAULT)
+
+
+def typology(df):
+    return apply_rules(df, TYPOLOGY_RULES, TYPOLOGY_DEFAULT)
+
+
+def recommend(df):
+    """(recommended_action, rationale) arrays for stage 06."""
+    codes = rule_codes(df, RECOMMENDATION_RULES)
+    labels = [label for label, _ in RECOMMENDATION_RULES] + [RECOMMENDATION_DEFAULT]
+    actions = np.array([a for a, _ in labels], dtype=object)
+    rationales = np.array([r for _, r in labels], dtype=object)
+    return actions[codes], rationales[codes]
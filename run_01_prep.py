@@ -1,5 +1,13 @@
-import pandas as pd
+import argparse
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import instrument
+import storage
+import validation
 
 # CONFIGURATION: Deterministic File Mappings
 # Mapping structure: State -> { Category -> Filename }
@@ -26,6 +34,19 @@ FILE_MAP = {
     }
 }
 
+# A JSON file of the same shape named by $AADHAAR_FILE_MAP replaces the mapping
+# (e.g. the synthetic datasets from synth.py). Worker processes read it too.
+if os.environ.get('AADHAAR_FILE_MAP'):
+    with open(os.environ['AADHAAR_FILE_MAP']) as f:
+        FILE_MAP = json.load(f)
+
+# Output table per service category, in processing order (see storage.py)
+CATEGORY_OUTPUTS = {
+    "Enrollment": "district_monthly_enrollment",
+    "Demographic": "district_monthly_demographic",
+    "Biometric": "district_monthly_biometric"
+}
+
 # Column Normalization Map  
 COL_RENAME_MAP = {
     "age_18_greater": "age_18_plus",
@@ -38,94 +59,297 @@ COL_RENAME_MAP = {
     "bio_age_17_": "age_18_plus"
 }
 
-def process_category(category_name, output_filename):
-    print(f"Processing Category: {category_name}...")
-    all_data = []
-    
-    for state, files in FILE_MAP.items():
-        filename = files.get(category_name)
-        if not filename:
-            print(f"  WARNING: No file config for {state} - {category_name}")
-            continue
-            
-        path = os.path.join(state, filename)
-        if not os.path.exists(path):
-            print(f"  ERROR: File not found: {path}")
-            continue
-            
-        print(f"  Loading {state}: {path}")
+REQUIRED_METRICS = ['age_0_5', 'age_5_17', 'age_18_plus']
+GROUP_KEYS = ['state', 'district', 'month']
+OUTPUT_COLS = GROUP_KEYS + REQUIRED_METRICS + ['total']
+
+# Streaming mode: rows per chunk when reading raw state files
+DEFAULT_CHUNKSIZE = 500_000
+
+
+def normalize_columns(columns):
+    """Lower-case, strip and rename raw column names to the canonical schema."""
+    cleaned = [c.strip().lower() for c in columns]
+    return [COL_RENAME_MAP.get(c, c) for c in cleaned]
+
+
+def _map_unique(values, func):
+    """Apply a vectorized string transform once per distinct value.
+
+    Raw files repeat the same few hundred dates and districts millions of
+    times, so the expensive parsing is done on the uniques and broadcast back.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    mapped = func(pd.Series(uniques, dtype=object))
+    return pd.Series(mapped.to_numpy()[codes], index=values.index)
+
+
+def _parse_month(dates):
+    # UIDAI data date format is usually DD-MM-YYYY based on inspection
+    parsed = pd.to_datetime(dates, format='%d-%m-%Y', errors='coerce')
+    return parsed.dt.strftime('%Y-%m')
+
+
+def _parse_counts(values):
+    return pd.to_numeric(values, errors='coerce')
+
+
+def _normalize_district(districts):
+    return districts.astype(str).str.strip().str.title()
+
+
+def aggregate_frame(df, state, path, report=None):
+    """Clean one raw frame and reduce it to state/district/month sums.
+
+    Returns None when the frame cannot be used (missing base columns or a
+    date parsing failure), after printing the reason. With a
+    validation.FileReport, the chunk's data quality checks are recorded from
+    the same parsed columns the aggregation uses.
+    """
+    instrument.count(rows_in=len(df))
+
+    # 1. Clean Column Names / 2. Rename specific columns
+    df.columns = normalize_columns(df.columns)
+
+    # MANDATORY FIX 2: Base Column Validation
+    required_base_cols = ['date', 'district']
+    missing_base = [col for col in required_base_cols if col not in df.columns]
+    for col in missing_base:
+        print(f"ERROR: Missing required column '{col}' in {path}")
+    if missing_base:
+        if report is not None:
+            report.fail(f"missing required columns {missing_base}")
+        return None
+
+    # 3. Date Parsing (invalid dates become NaN and are dropped)
+    try:
+        month = _map_unique(df['date'], _parse_month)
+    except Exception as e:
+        print(f"    Date parse error in {path}: {e}")
+        if report is not None:
+            report.fail(f"date parse error: {e}")
+        return None
+
+    # MANDATORY FIX 1: District Name Normalization
+    district = _map_unique(df['district'], _normalize_district)
+
+    # MANDATORY FIX 3: Numeric Safety Before Aggregation
+    counts = {col: _map_unique(df[col], _parse_counts) for col in REQUIRED_METRICS if col in df.columns}
+
+    if report is not None:
+        report.check(df, month, district, counts, [col for col in REQUIRED_METRICS if col not in counts])
+
+    # 4. Standardize State Name (Ensure it matches the key)
+    clean = pd.DataFrame({'state': state, 'district': district, 'month': month}, index=df.index)
+
+    # 5. Handle missing columns if any (fill with 0 for summation)
+    for col in REQUIRED_METRICS:
+        clean[col] = counts[col].fillna(0) if col in counts else 0
+    clean = clean[month.notna().to_numpy()]
+
+    # 6. Group By State, District, Month
+    return clean.groupby(GROUP_KEYS, as_index=False)[REQUIRED_METRICS].sum()
+
+
+def _fold(partial, grouped):
+    """Merge a chunk aggregate into the running partial aggregate."""
+    if partial is None:
+        return grouped
+    combined = pd.concat([partial, grouped], ignore_index=True)
+    return combined.groupby(GROUP_KEYS, as_index=False)[REQUIRED_METRICS].sum()
+
+
+def aggregate_file_streaming(path, state, chunksize=DEFAULT_CHUNKSIZE, report=None):
+    """Aggregate a raw state file in bounded chunks.
+
+    Only the date, district, pincode and age columns are parsed, and each
+    chunk is folded into a running state/district/month aggregate, so peak
+    memory follows ``chunksize`` rather than the file size. Age counts are
+    read as categories (1-2 byte codes per row, each distinct value parsed
+    once) rather than inferred, which would give int64/float64 columns, or
+    object columns once a chunk holds a non-numeric cell. ``report`` keeps
+    the hashes of rows already read, so duplicates are flagged across chunks.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    wanted = {'date', 'district', *REQUIRED_METRICS, *validation.DUPLICATE_COLS}
+    names = dict(zip(header, normalize_columns(header)))
+    usecols = [raw for raw, name in names.items() if name in wanted]
+    dtypes = {raw: str if name in ('date', 'district') else 'category'
+              for raw, name in names.items() if name in ('date', 'district', *REQUIRED_METRICS)}
+
+    partial = None
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+        grouped = aggregate_frame(chunk, state, path, report)
+        if grouped is None:
+            return None
+        partial = _fold(partial, grouped)
+    return partial
+
+
+def load_state_category(state, category_name, chunksize=None, known=None, max_bad_fraction=None):
+    """Load and aggregate one (state, category) raw file.
+
+    Returns the state/district/month frame with ``total`` added, or None if
+    the file is not configured, missing or unusable. Each call is
+    independent, so it can run in a worker process.
+
+    The file's data quality report (see validation.py) is written to
+    quality/. ``known`` maps states to their valid district names. With
+    ``max_bad_fraction`` the file is streamed and validation.ValidationError
+    is raised as soon as more than that share of its rows fail a check.
+    """
+    filename = FILE_MAP[state].get(category_name)
+    if not filename:
+        print(f"  WARNING: No file config for {state} - {category_name}")
+        return None
+
+    path = os.path.join(state, filename)
+    if not os.path.exists(path):
+        print(f"  ERROR: File not found: {path}")
+        return None
+
+    if max_bad_fraction is not None and not chunksize:
+        chunksize = DEFAULT_CHUNKSIZE
+    report = validation.FileReport(path, state, category_name, None if known is None else known.get(state, set()),
+                                   max_bad_fraction)
+
+    print(f"  Loading {state}: {path}")
+    with instrument.stage(f"01.{category_name}.{state}", file=path, chunksize=chunksize) as record:
+        record['bytes_read'] = os.path.getsize(path)
         try:
-            df = pd.read_csv(path)
+            if chunksize:
+                grouped = aggregate_file_streaming(path, state, chunksize, report)
+            else:
+                grouped = aggregate_frame(pd.read_csv(path), state, path, report)
+            report.enforce()
+        except validation.ValidationError as e:
+            print(f"  ABORTED: {e}")
+            report.error = str(e)
+            report.write()
+            raise
         except Exception as e:
             print(f"  ERROR reading {path}: {e}")
-            continue
-        
-        # 1. Clean Column Names
-        df.columns = [c.strip().lower() for c in df.columns]
-        
-        # 2. Rename specific columns
-        df.rename(columns=COL_RENAME_MAP, inplace=True)
-        
-        # MANDATORY FIX 2: Base Column Validation
-        required_base_cols = ['date', 'district']
-        missing_base = False
-        for col in required_base_cols:
-            if col not in df.columns:
-                print(f"ERROR: Missing required column '{col}' in {path}")
-                missing_base = True
-        if missing_base:
-            continue
-
-        # 3. Date Parsing
-        try:
-            # UIDAI data date format is usually DD-MM-YYYY based on inspection
-            df['date'] = pd.to_datetime(df['date'], format='%d-%m-%Y', errors='coerce')
-            # Drop invalid dates if any
-            df = df.dropna(subset=['date'])
-            df['month'] = df['date'].dt.strftime('%Y-%m')
-        except Exception as e:
-            print(f"    Date parse error in {path}: {e}")
-            continue
-            
-        # 4. Standardize State Name (Ensure it matches the key)
-        df['state'] = state
-        
-        # MANDATORY FIX 1: District Name Normalization
-        df['district'] = df['district'].astype(str).str.strip().str.title()
-        
-        # 5. Handle missing columns if any (fill with 0 for summation)
-        required_metrics = ['age_0_5', 'age_5_17', 'age_18_plus']
-        for col in required_metrics:
-            if col not in df.columns:
-                df[col] = 0
-        
-        # MANDATORY FIX 3: Numeric Safety Before Aggregation
-        for col in required_metrics:
-             df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-        # 6. Group By
-        # Group by State, District, Month
-        grouped = df.groupby(['state', 'district', 'month'], as_index=False)[required_metrics].sum()
-        
+            record['status'] = 'error'
+            record['error'] = str(e)
+            return None
+        finally:
+            record['rows_flagged'] = report.bad_rows
+        report.write()
+        print(f"    Quality: {report.summary()}")
+        if grouped is None:
+            record['status'] = 'skipped'
+            return None
+
         # 7. Calculate Total
         grouped['total'] = grouped['age_0_5'] + grouped['age_5_17'] + grouped['age_18_plus']
-        
-        all_data.append(grouped)
-        
+        record['rows_out'] = len(grouped)
+        return grouped
+
+
+def write_category(category_name, output_name, frames, partition_dir=None):
+    """Concatenate per-state frames (in FILE_MAP order) and save the table.
+
+    With ``partition_dir`` each state's frame is also written as one file
+    under <partition_dir>/<output_name>/ for the out-of-core pipeline
+    backend (see partitioned.py).
+    """
+    all_data = [f for f in frames if f is not None]
+
     # Combine all states
+    with instrument.stage(f"01.write.{category_name}"):
+        _write_combined(category_name, output_name, all_data)
+        if partition_dir:
+            import partitioned
+            for frame in all_data:
+                partitioned.write_partitions(frame, partition_dir, output_name)
+
+
+def _write_combined(category_name, output_name, all_data):
     if all_data:
         final_df = pd.concat(all_data, ignore_index=True)
-        
+
         # Reorder columns
-        cols = ['state', 'district', 'month', 'age_0_5', 'age_5_17', 'age_18_plus', 'total']
-        final_df = final_df[cols]
-        
-        final_df.to_csv(output_filename, index=False)
-        print(f"  Saved {output_filename} with {len(final_df)} rows.")
+        final_df = final_df[OUTPUT_COLS]
+
+        path = storage.write_table(final_df, output_name)
+        print(f"  Saved {path} with {len(final_df)} rows.")
     else:
         print(f"  No data found for {category_name}")
 
+
+def process_category(category_name, output_name, chunksize=None, partition_dir=None, known=None,
+                     max_bad_fraction=None):
+    """Aggregate one service category across all FILE_MAP states.
+
+    With ``chunksize`` set, each state file is streamed in chunks of that
+    many rows instead of being loaded whole; the output is identical.
+    """
+    print(f"Processing Category: {category_name}...")
+    frames = [load_state_category(state, category_name, chunksize, known, max_bad_fraction) for state in FILE_MAP]
+    write_category(category_name, output_name, frames, partition_dir)
+
+
+def process_all(workers=1, chunksize=None, partition_dir=None, known=None, max_bad_fraction=None):
+    """Build every district_monthly_* table, optionally across a process pool.
+
+    With ``workers > 1`` all (category, state) jobs are fanned out to a
+    ProcessPoolExecutor. Results are collected in submission order, so the
+    output rows are identical to a serial run regardless of finish order.
+    The first job to fail (e.g. a fail-fast ValidationError) cancels the
+    jobs still queued and is re-raised.
+    """
+    if workers <= 1:
+        for category_name, output_name in CATEGORY_OUTPUTS.items():
+            process_category(category_name, output_name, chunksize, partition_dir, known, max_bad_fraction)
+        return
+
+    jobs = [(category_name, state) for category_name in CATEGORY_OUTPUTS for state in FILE_MAP]
+    print(f"Processing {len(jobs)} (category, state) jobs on {workers} workers...")
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(load_state_category, state, category_name, chunksize, known, max_bad_fraction)
+                   for category_name, state in jobs]
+        # Surface the first failure (e.g. a fail-fast ValidationError) as soon as it happens
+        for future in as_completed(futures):
+            future.result()
+    except BaseException:
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    frames = {}
+    for (category_name, _), future in zip(jobs, futures):
+        frames.setdefault(category_name, []).append(future.result())
+    for category_name, output_name in CATEGORY_OUTPUTS.items():
+        write_category(category_name, output_name, frames[category_name], partition_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate raw UIDAI state files into district_monthly_* tables")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help=f"stream raw files in chunks of this many rows (e.g. {DEFAULT_CHUNKSIZE})")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes for (category, state) jobs (default: 1, serial)")
+    parser.add_argument('--partition-dir', default=None,
+                        help="also write per-state partitions here for run_pipeline --backend partitioned")
+    parser.add_argument('--known-districts', default=None,
+                        help="CSV of valid state,district pairs; other districts are flagged in the quality reports")
+    parser.add_argument('--max-bad-fraction', type=float, default=None,
+                        help="fail fast: abort when more than this share of a file's rows fail validation (e.g. 0.05)")
+    parser.add_argument('--cube', action='store_true',
+                        help="also build the state x district x month x category x age band cube (see cube.py)")
+    args = parser.parse_args(argv)
+
+    known = validation.load_known_districts(args.known_districts) if args.known_districts else None
+    try:
+        process_all(args.workers, args.chunksize, args.partition_dir, known, args.max_bad_fraction)
+    except validation.ValidationError as e:
+        raise SystemExit(f"Validation failed: {e}")
+
+    if args.cube:
+        import cube
+        print(f"Saved {cube.Cube.from_tables().save()}")
+
+
 if __name__ == "__main__":
-    process_category("Enrollment", "district_monthly_enrollment.csv")
-    process_category("Demographic", "district_monthly_demographic.csv")
-    process_category("Biometric", "district_monthly_biometric.csv")
+    raise SystemExit(main())
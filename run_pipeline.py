@@ -1,195 +1,203 @@
-import pandas as pd
-import numpy as np
+import argparse
 import warnings
-from sklearn.preprocessing import MinMaxScaler
+
+import pandas as pd
+
+import dag
+import forecast
+import instrument
+import keys
+import rules
+import spikes
+import stages
+import storage
 warnings.filterwarnings('ignore')
 
-print("Starting Pipeline...")
-
-# --- 02 ---
-print("Running 02...")
-try:
-    df_enroll = pd.read_csv('district_monthly_enrollment.csv')
-    df_bio = pd.read_csv('district_monthly_biometric.csv')
-    df_demo = pd.read_csv('district_monthly_demographic.csv')
-
-    def agg(df, name):
-        return df.groupby(['state', 'district'])['total'].sum().reset_index().rename(columns={'total': f'{name}_vol'})
-
-    a_en = agg(df_enroll, 'enrollment')
-    a_bi = agg(df_bio, 'biometric')
-    a_de = agg(df_demo, 'demographic')
-    master = a_en.merge(a_bi, on=['state','district']).merge(a_de, on=['state','district'])
-    master['total_volume'] = master['enrollment_vol'] + master['biometric_vol'] + master['demographic_vol']
-
-    master['enrollment_ratio'] = master['enrollment_vol'] / master['total_volume']
-    master['biometric_ratio'] = master['biometric_vol'] / master['total_volume']
-    master['demographic_ratio'] = master['demographic_vol'] / master['total_volume']
-    master['dominance_score'] = master[['enrollment_ratio', 'biometric_ratio', 'demographic_ratio']].max(axis=1)
-
-    def classify(row):
-        s = row['dominance_score']
-        if row['enrollment_ratio'] == s: t = 'Enrollment'
-        elif row['biometric_ratio'] == s: t = 'Biometric'
-        else: t = 'Demographic'
-        if s >= 0.6: st = 'Strong Dominant'
-        elif s >= 0.4: st = 'Mixed Demand'
-        else: st = 'Balanced Demand'
-        return pd.Series([t, st])
-
-    master[['dominant_type', 'dominance_strength']] = master.apply(classify, axis=1)
-
-    def op_meaning(row):
-        if row['dominance_strength'] == 'Strong Dominant':
-            if row['dominant_type'] == 'Enrollment': return 'New Population Entry'
-            if row['dominant_type'] == 'Biometric': return 'Maintenance Burden'
-        return 'General Service Load'
-    master['operational_meaning'] = master.apply(op_meaning, axis=1)
-
-    final_02 = master[['state', 'district', 'enrollment_ratio', 'biometric_ratio', 'demographic_ratio', 'dominant_type', 'dominance_score', 'dominance_strength', 'operational_meaning']].copy()
-    final_02.round(3).to_csv('02_output.csv', index=False)
-    print("Saved 02_output.csv")
-except Exception as e:
-    print(f"Error in 02: {e}")
-
-# --- 03 ---
-print("Running 03...")
-try:
-    df_all = pd.concat([df_enroll, df_bio, df_demo])
-    district_monthly = df_all.groupby(['state', 'district', 'month'])['total'].sum().reset_index()
-
-    metrics = district_monthly.groupby(['state', 'district'])['total'].agg(total_volume='sum', volatility='std').reset_index()
-
-    def get_growth(x):
-        if len(x) < 2: return 0
-        return x['total'].pct_change().mean()
-
-    growth = district_monthly.groupby(['state', 'district']).apply(get_growth).reset_index(name='monthly_growth_rate')
-    metrics = metrics.merge(growth, on=['state', 'district'])
-    metrics['monthly_growth_rate'] = metrics['monthly_growth_rate'].fillna(0)
-
-    scaler = MinMaxScaler()
-    cols = ['total_volume', 'monthly_growth_rate', 'volatility']
-    norm_cols = [f'norm_{c}' for c in cols]
-    metrics[norm_cols] = scaler.fit_transform(metrics[cols].fillna(0))
-
-    metrics['pressure_index'] = 0.5 * metrics['norm_total_volume'] + 0.3 * metrics['norm_monthly_growth_rate'] + 0.2 * metrics['norm_volatility']
-
-    def classify_pressure(x):
-        if x >= 0.75: return 'Critical Infrastructure Stress'
-        if x >= 0.55: return 'High Stress'
-        if x >= 0.35: return 'Moderate Stress'
-        return 'Stable'
-
-    metrics['pressure_tier'] = metrics['pressure_index'].apply(classify_pressure)
-    out_03 = metrics[['state', 'district', 'pressure_index', 'pressure_tier', 'total_volume', 'monthly_growth_rate', 'volatility']]
-    out_03.round(3).to_csv('03_output.csv', index=False)
-    print("Saved 03_output.csv")
-except Exception as e:
-    print(f"Error in 03: {e}")
-
-# --- 04 ---
-print("Running 04...")
-try:
-    age_sum = df_all.groupby(['state', 'district'])[['age_0_5', 'age_5_17', 'age_18_plus', 'total']].sum().reset_index()
-    combined = age_sum.merge(metrics[['state', 'district', 'pressure_tier']], on=['state', 'district'])
-    combined = combined.merge(metrics[['state', 'district', 'volatility']], on=['state', 'district']) 
-    combined = combined.merge(master[['state', 'district', 'dominant_type']], on=['state', 'district'])
-
-    combined['child_pressure'] = combined['age_0_5'] + combined['age_5_17']
-    combined['adult_pressure'] = combined['age_18_plus']
-    combined['child_ratio'] = combined['child_pressure'] / combined['total']
-    combined['adult_ratio'] = combined['adult_pressure'] / combined['total']
-
-    def get_typology(row):
-        tier = row['pressure_tier']
-        c_ratio = row['child_ratio']
-        a_ratio = row['adult_ratio']
-        is_high_crit = tier in ['High Stress', 'Critical Infrastructure Stress']
-        
-        if c_ratio > 0.6 and is_high_crit:
-            return 'School-linked Surge Zone'
-        if a_ratio > 0.7 and is_high_crit:
-            return 'Correctional Overload Zone'
-        if row['dominant_type'] == 'Biometric' and row['volatility'] > 100: 
-            return 'Migration Impact Zone'
-        return 'Population Expansion Zone'
-
-    combined['typology'] = combined.apply(get_typology, axis=1)
-    out_04 = combined[['state', 'district', 'typology', 'child_ratio', 'adult_ratio', 'pressure_tier']]
-    out_04.round(3).to_csv('04_output.csv', index=False)
-    print("Saved 04_output.csv")
-except Exception as e:
-    print(f"Error in 04: {e}")
-
-# --- 05 ---
-print("Running 05...")
-try:
-    results = []
-    for (state, dist), group in district_monthly.groupby(['state', 'district']):
-        mean = group['total'].mean()
-        std = group['total'].std()
-        if std == 0: continue
-        spikes = group[group['total'] > mean + 2*std]
-        
-        spike_months = spikes['month'].tolist()
-        spike_type = 'Irregular/Migration'
-        if len(spike_months) > 1:
-            spike_type = 'Seasonal Pattern'
-        
-        if len(spike_months) > 0:
-            results.append({
-                'state': state,
-                'district': dist,
-                'spike_months': str(spike_months),
-                'spike_type': spike_type,
-                'volatility': std
-            })
-    out_05 = pd.DataFrame(results)
-    if not out_05.empty:
-        out_05.round(3).to_csv('05_output.csv', index=False)
-        print("Saved 05_output.csv")
-    else:
+# Stages 02-06 as a DAG of cached nodes (see dag.py). Each node's output is
+# cached on disk keyed by its inputs and parameters, so a rerun only
+# recomputes the nodes whose code, parameters or input data changed.
+# Inputs are encoded once against a DistrictIndex on load, so every node works
+# on integer district_id / month_id keys; names are decoded on write.
+# --backend partitioned runs the same stage functions state by state over
+# on-disk partitions instead (see partitioned.py), for data larger than RAM.
+
+SOURCES = {
+    'df_enroll': 'district_monthly_enrollment',
+    'df_bio': 'district_monthly_biometric',
+    'df_demo': 'district_monthly_demographic'
+}
+CATEGORY_FRAMES = list(SOURCES)
+
+
+def demand_decomposition(df_enroll, df_bio, df_demo):
+    a_en = stages.category_volume(df_enroll, 'enrollment')
+    a_bi = stages.category_volume(df_bio, 'biometric')
+    a_de = stages.category_volume(df_demo, 'demographic')
+    return stages.decompose_demand(a_en, a_bi, a_de)
+
+
+def combined_monthly(df_enroll, df_bio, df_demo):
+    return stages.monthly_totals(pd.concat([df_enroll, df_bio, df_demo]))
+
+
+def pressure_metrics(district_monthly):
+    return stages.pressure_index(stages.district_metrics(district_monthly))
+
+
+def combined_age_sums(df_enroll, df_bio, df_demo):
+    return stages.age_sums(pd.concat([df_enroll, df_bio, df_demo]))
+
+
+def typology_output(age_sum, metrics, master):
+    return stages.demand_typology(age_sum, metrics, master)[stages.OUT_04_COLS]
+
+
+# Functions whose source each node's cache key covers besides its own (see
+# dag.Node). Rule tables and their defaults are node params, so editing one
+# only invalidates the nodes that read it; the rule engine itself is code.
+RULE_ENGINE = [rules._condition, rules.rule_codes, rules.apply_rules]
+METRICS_CODE = [stages.district_metrics, stages.district_segments, stages.segment_growth,
+                stages.pressure_index, stages.min_max_normalize, rules.classify_pressure, *RULE_ENGINE]
+PRESSURE_TIER = (rules.PRESSURE_TIER_RULES, rules.PRESSURE_TIER_DEFAULT)
+
+NODES = [
+    dag.Node('master', demand_decomposition, CATEGORY_FRAMES,
+             {'dominant_type': (rules.DOMINANT_TYPE_RULES, rules.DOMINANT_TYPE_DEFAULT),
+              'dominance_strength': (rules.DOMINANCE_STRENGTH_RULES, rules.DOMINANCE_STRENGTH_DEFAULT),
+              'operational_meaning': (rules.OPERATIONAL_MEANING_RULES, rules.OPERATIONAL_MEANING_DEFAULT)},
+             code=[stages.category_volume, stages.decompose_demand, keys.join,
+                   rules.classify_dominance, rules.operational_meaning, *RULE_ENGINE]),
+    dag.Node('district_monthly', combined_monthly, CATEGORY_FRAMES, code=[stages.monthly_totals]),
+    dag.Node('metrics', pressure_metrics, ['district_monthly'],
+             {'weights': stages.PRESSURE_WEIGHTS, 'pressure_tier': PRESSURE_TIER}, code=METRICS_CODE),
+    dag.Node('age_sum', combined_age_sums, CATEGORY_FRAMES, code=[stages.age_sums]),
+    dag.Node('out_04', typology_output, ['age_sum', 'metrics', 'master'],
+             {'typology': (rules.TYPOLOGY_RULES, rules.TYPOLOGY_DEFAULT)},
+             code=[stages.demand_typology, keys.join, rules.typology, *RULE_ENGINE]),
+    dag.Node('out_05', stages.detect_spikes, ['district_monthly'],
+             code=[stages.district_segments, keys.month_labels]),
+    dag.Node('spikes', spikes.spike_stage, CATEGORY_FRAMES + ['district_monthly'],
+             {'window': spikes.SPIKE_WINDOW, 'season': spikes.SEASON, 'min_periods': spikes.MIN_PERIODS,
+              'threshold': spikes.Z_THRESHOLD,
+              'scales': [spikes.MAD_SCALE, spikes.MEAN_AD_SCALE, spikes.MIN_SCALE, spikes.COUNT_NOISE]},
+             code=[spikes.complete_months, spikes.spike_table, spikes.baselines, spikes.rolling_baseline,
+                   spikes._sorted_median, spikes.count_noise, spikes._empty, stages.series_matrix]),
+    dag.Node('out_06', stages.policy_recommendations, ['out_04', 'metrics', 'master'],
+             {'recommendation': (rules.RECOMMENDATION_RULES, rules.RECOMMENDATION_DEFAULT)},
+             code=[keys.join, rules.recommend, rules.rule_codes, rules._condition]),
+    dag.Node('out_07', forecast.forecast_stage, CATEGORY_FRAMES + ['district_monthly'],
+             {'horizon': forecast.FORECAST_HORIZON, 'season': forecast.SEASON, 'alphas': list(forecast.ALPHAS),
+              'weights': stages.PRESSURE_WEIGHTS, 'pressure_tier': PRESSURE_TIER},
+             code=[stages.series_matrix, forecast.forecast, forecast.select_models, forecast.model_forecasts,
+                   forecast._last, forecast.seasonal_naive, forecast.exp_smoothing, forecast.linear_trend,
+                   keys.join, *METRICS_CODE]),
+]
+
+# Stage id -> (nodes belonging to the stage, node written out, output table, output formatter)
+STAGES = {
+    '02': (['master'], 'master', '02_output', lambda df: df[stages.OUT_02_COLS].round(3)),
+    '03': (['district_monthly', 'metrics'], 'metrics', '03_output', lambda df: df[stages.OUT_03_COLS].round(3)),
+    '04': (['age_sum', 'out_04'], 'out_04', '04_output', lambda df: df.round(3)),
+    '05': (['out_05'], 'out_05', '05_output', lambda df: df.round(3)),
+    '05s': (['spikes'], 'spikes', '05_spikes', lambda df: df.round(3)),
+    '06': (['out_06'], 'out_06', '06_output', lambda df: df),
+    '07': (['out_07'], 'out_07', '07_output', lambda df: df.round(3)),
+}
+
+
+def load_sources():
+    """The district_monthly inputs, encoded against one DistrictIndex built from all three."""
+    frames = {name: storage.read_table(table) for name, table in SOURCES.items()}
+    index = keys.DistrictIndex.from_frames(frames.values())
+    return {name: index.encode(df) for name, df in frames.items()}, index
+
+
+def formatted_outputs(results, index):
+    """Output table name -> frame exactly as write_stage would save it."""
+    return {table: index.decode(fmt(results[node])) for _, node, table, fmt in STAGES.values() if node in results}
+
+
+def verify_backend(results, index):
+    """Cross-check partitioned results against the in-memory pandas backend; returns mismatch descriptions."""
+    from incremental import compare_outputs
+
+    sources, memory_index = load_sources()
+    expected, _ = dag.Pipeline(NODES).run(sources, targets=list(results))
+    return compare_outputs(formatted_outputs(results, index), formatted_outputs(expected, memory_index), rtol=0, atol=0)
+
+
+def write_stage(stage, results, index):
+    _, node, table, fmt = STAGES[stage]
+    if node not in results:
+        print(f"Skipped {table}: stage {stage} did not complete")
+        return
+    if stage == '05' and results[node].empty:
         print("No spikes detected.")
-except Exception as e:
-    print(f"Error in 05: {e}")
-
-# --- 06 ---
-print("Running 06...")
-try:
-    merged = out_04.merge(metrics[['state', 'district', 'volatility']], on=['state', 'district']) 
-    merged = merged.merge(master[['state', 'district', 'dominance_strength', 'dominant_type']], on=['state', 'district'])
-
-    def recommend(row):
-        tier = row['pressure_tier']
-        typo = row['typology']
-        dtype = row['dominant_type']
-        
-        action = "Deploy mobile enrollment vans"
-        rationale = "High adult correction load + volatility indicates migrant churn."
-        
-        if typo == 'School-linked Surge Zone':
-            action = "Launch school-based biometric drives"
-            rationale = "High child ratio indicates school admission season pressure."
-        elif typo == 'Correctional Overload Zone':
-            action = "Set up temporary camps"
-            rationale = "Adult dominance suggests high demand for updates."
-        elif tier == 'Critical Infrastructure Stress':
-            action = "Set up temporary camps"
-            rationale = "Critical stress levels require immediate capacity expansion."
-        elif row['dominance_strength'] == 'Strong Dominant':
-            if dtype == 'Biometric':
-                 action = "Increase biometric operators"
-                 rationale = "Biometric heavy load requires specialized operators."
-            
-        return pd.Series([action, rationale])
-
-    merged[['recommended_action', 'rationale']] = merged.apply(recommend, axis=1)
-    
-    # FIX: Select 'typology' then rename
-    out_06 = merged[['state', 'district', 'typology', 'pressure_tier', 'recommended_action', 'rationale']]
-    out_06.rename(columns={'typology': 'classification'}, inplace=True)
-    out_06.to_csv('06_output.csv', index=False)
-    print("Saved 06_output.csv")
-except Exception as e:
-    print(f"Error in 06: {e}")
+        return
+    with instrument.stage(f"write.{table}"):
+        path = storage.write_table(index.decode(fmt(results[node])), table, storage.OUTPUT_FORMAT)
+    print(f"Saved {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run pipeline stages 02-06 with on-disk stage caching")
+    parser.add_argument('--only', nargs='+', choices=list(STAGES), metavar='STAGE',
+                        help="run only these stages (plus whatever they depend on)")
+    parser.add_argument('--force', nargs='*', choices=list(STAGES), metavar='STAGE',
+                        help="recompute these stages (all if none given) even when cached")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the stage cache")
+    parser.add_argument('--backend', choices=['pandas', 'partitioned'], default='pandas',
+                        help="pandas: in memory with stage caching (default); partitioned: out-of-core over --partition-dir")
+    parser.add_argument('--partition-dir', default='partitions',
+                        help="district_monthly partitions for --backend partitioned (see partitioned.py)")
+    parser.add_argument('--verify', action='store_true',
+                        help="with --backend partitioned, also run the pandas backend in memory and compare outputs")
+    parser.add_argument('--cache-dir', default=dag.DEFAULT_CACHE_DIR)
+    parser.add_argument('--cache-size-mb', type=int, default=dag.DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help="evict least recently used cache entries beyond this size")
+    args = parser.parse_args(argv)
+
+    print("Starting Pipeline...")
+    if args.backend == 'partitioned':
+        import partitioned
+        results, index = partitioned.run(args.partition_dir)
+        for stage in args.only or list(STAGES):
+            if stage in partitioned.UNSUPPORTED_STAGES:
+                print(f"Skipped {STAGES[stage][2]}: stage {stage} is not supported by the partitioned backend")
+                continue
+            write_stage(stage, results, index)
+        if args.verify:
+            problems = verify_backend(results, index)
+            if problems:
+                print("Verification FAILED:")
+                for problem in problems:
+                    print(f"  {problem}")
+                return 1
+            print("Verification passed: partitioned outputs match the pandas backend.")
+        return 0
+
+    try:
+        with instrument.stage('load_inputs'):
+            sources, index = load_sources()
+    except Exception as e:
+        print(f"Error loading inputs: {e}")
+        return 1
+
+    selected = args.only or list(STAGES)
+    forced = set()
+    if args.force is not None:
+        for stage in args.force or list(STAGES):
+            forced.update(STAGES[stage][0])
+
+    cache = None if args.no_cache else dag.StageCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+    pipeline = dag.Pipeline(NODES, cache)
+    results, report = pipeline.run(sources, targets=[STAGES[s][1] for s in selected], force=forced,
+                                   on_error=lambda name, e: print(f"Error in {name}: {e}"))
+
+    for stage in selected:
+        write_stage(stage, results, index)
+    print(dag.format_report(report))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
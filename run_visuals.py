@@ -1,57 +1,91 @@
-import pandas as pd
-import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
-import warnings
+import argparse
 import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import dag
+import instrument
+import keys
+import storage
 
 warnings.filterwarnings('ignore')
-sns.set_style('whitegrid')
 
-if not os.path.exists('visuals'):
-    os.makedirs('visuals')
+# Figures are rendered from frames loaded once per run. Each PNG records a
+# hash of the exact data (and plotting code) it was drawn from, so figures
+# whose inputs are unchanged are skipped. Plots can be rendered in a process
+# pool, and --by-state adds one figure set per state under visuals/<state>/.
+
+HASH_KEY = 'InputHash'
+MONTHLY_TABLES = ['district_monthly_enrollment', 'district_monthly_biometric', 'district_monthly_demographic']
+
+# matplotlib and seaborn are imported on the first render (see load_plotting),
+# so runs where every figure is unchanged never pay for them
+plt = None
+sns = None
+
+
+def load_plotting():
+    global plt, sns
+    if plt is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot
+        import seaborn
+        seaborn.set_style('whitegrid')
+        plt, sns = matplotlib.pyplot, seaborn
+
+
+def load_data():
+    df03 = storage.read_table('03_output')
+    df04 = storage.read_table('04_output')
+    df06 = storage.read_table('06_output')
+    df02 = storage.read_table('02_output')
 
-print("Starting Visual Generation...")
+    # Merge for comprehensive view, joined on district ids
+    index = keys.DistrictIndex.from_frames([df06, df03, df04, df02])
+    df_full = index.encode(df06)
+    df_full = keys.join(df_full, index.encode(df03[['state', 'district', 'total_volume', 'monthly_growth_rate', 'volatility', 'pressure_index']]))
+    df_full = keys.join(df_full, index.encode(df04[['state', 'district', 'child_ratio', 'adult_ratio']]))
+    df_full = keys.join(df_full, index.encode(df02[['state', 'district', 'dominance_score', 'dominant_type']]))
+    df_full = index.decode(df_full)
 
-# Load Data
-try:
-    df03 = pd.read_csv('03_output.csv')
-    df04 = pd.read_csv('04_output.csv')
-    df06 = pd.read_csv('06_output.csv')
-    df02 = pd.read_csv('02_output.csv')
+    raw_all = pd.concat([storage.read_table(t, columns=['state', 'district', 'month', 'total']) for t in MONTHLY_TABLES])
+    return {'df_full': df_full, 'df02': df02, 'df03': df03, 'df06': df06, 'raw_all': raw_all,
+            'monthly': district_monthly_totals(raw_all)}
+
+
+def state_subset(data, state):
+    """The same frames restricted to one state, with ``monthly`` rebuilt from the state's rows."""
+    subset = {name: df[df['state'] == state] for name, df in data.items() if name != 'monthly'}
+    subset['monthly'] = district_monthly_totals(subset['raw_all'])
+    return subset
+
+
+def district_monthly_totals(raw_all):
+    return raw_all.groupby(['district', 'month'])['total'].sum().reset_index()
 
-    # Merge for comprehensive view
-    df_full = df06.merge(df03[['state', 'district', 'total_volume', 'monthly_growth_rate', 'volatility', 'pressure_index']], on=['state', 'district'])
-    df_full = df_full.merge(df04[['state', 'district', 'child_ratio', 'adult_ratio']], on=['state', 'district'])
-    df_full = df_full.merge(df02[['state', 'district', 'dominance_score', 'dominant_type']], on=['state', 'district'])
-    print("Data Loaded Successfully.")
-except Exception as e:
-    print(f"Data Load Error: {e}")
-    exit()
 
 # 1. Crisis Quadrant
-try:
+def plot_crisis_quadrant(df_full):
     plt.figure(figsize=(10, 6))
     sns.scatterplot(data=df_full, x='total_volume', y='monthly_growth_rate', hue='pressure_tier', palette='RdYlGn_r', s=100, alpha=0.7)
     plt.title('CRISIS QUADRANT: Infrastructure Load vs Velocity', fontsize=14, fontweight='bold')
     plt.xlabel('Total Service Volume')
     plt.ylabel('Monthly Growth Rate')
     plt.legend(title='Pressure Tier', bbox_to_anchor=(1.05, 1), loc='upper left')
-    
+
     criticals = df_full[df_full['pressure_tier'] == 'Critical Infrastructure Stress']
     if not criticals.empty:
         for i, row in criticals.head(5).iterrows():
             plt.text(row['total_volume'], row['monthly_growth_rate'], row['district'], fontsize=9)
-            
+
     plt.tight_layout()
-    plt.savefig('visuals/01_crisis_quadrant.png')
-    print('Saved 01_crisis_quadrant.png')
-    plt.close()
-except Exception as e:
-    print(f"Error Plot 1: {e}")
+
 
 # 2. Typology Matrix
-try:
+def plot_typology_matrix(df_full):
     plt.figure(figsize=(10, 6))
     sns.scatterplot(data=df_full, x='child_ratio', y='adult_ratio', hue='classification', palette='viridis', style='classification', s=120)
     plt.title('TYPOLOGY MATRIX: Demand Source Segregation', fontsize=14, fontweight='bold')
@@ -59,14 +93,10 @@ try:
     plt.ylabel('Adult Ratio (Correction Demand)')
     plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
     plt.tight_layout()
-    plt.savefig('visuals/02_typology_matrix.png')
-    print('Saved 02_typology_matrix.png')
-    plt.close()
-except Exception as e:
-    print(f"Error Plot 2: {e}")
+
 
 # 3. Pressure Tier Distribution
-try:
+def plot_pressure_distribution(df_full):
     plt.figure(figsize=(8, 5))
     tier_counts = df_full['pressure_tier'].value_counts()
     sns.barplot(x=tier_counts.index, y=tier_counts.values, palette='RdYlGn_r')
@@ -74,17 +104,10 @@ try:
     plt.ylabel('Number of Districts')
     plt.xlabel('Pressure Tier')
     plt.tight_layout()
-    plt.savefig('visuals/03_pressure_distribution.png')
-    print('Saved 03_pressure_distribution.png')
-    plt.close()
-except Exception as e:
-    print(f"Error Plot 3: {e}")
 
-# 4. Volatility Pulse Lines
-try:
-    raw_all = pd.concat([pd.read_csv(f) for f in ['district_monthly_enrollment.csv', 'district_monthly_biometric.csv', 'district_monthly_demographic.csv']])
-    monthly = raw_all.groupby(['district', 'month'])['total'].sum().reset_index()
 
+# 4. Volatility Pulse Lines
+def plot_volatility_pulse(df03, monthly):
     top_vol = df03.nlargest(3, 'volatility')['district'].tolist()
     top_stable = df03.nsmallest(3, 'volatility')['district'].tolist()
     targets = top_vol + top_stable
@@ -96,17 +119,13 @@ try:
     plt.xticks(rotation=45)
     plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
     plt.tight_layout()
-    plt.savefig('visuals/04_volatility_pulse.png')
-    print('Saved 04_volatility_pulse.png')
-    plt.close()
-except Exception as e:
-    print(f"Error Plot 4: {e}")
+
 
 # 5. Seasonality Heatmap
-try:
+def plot_seasonality_heatmap(df03, monthly):
     top_15_dist = df03.nlargest(15, 'total_volume')['district'].tolist()
     heat_data = monthly[monthly['district'].isin(top_15_dist)]
-    
+
     # Ensure pivot works even if duplicates exist (though group by district/month implies uniqueness)
     pivot = heat_data.pivot_table(index='district', columns='month', values='total', aggfunc='sum')
 
@@ -114,14 +133,10 @@ try:
     sns.heatmap(pivot, cmap='YlOrRd', linewidths=0.5)
     plt.title('SEASONALITY HEATMAP: Volume Intensity', fontsize=14, fontweight='bold')
     plt.tight_layout()
-    plt.savefig('visuals/05_seasonality_heatmap.png')
-    print('Saved 05_seasonality_heatmap.png')
-    plt.close()
-except Exception as e:
-    print(f"Error Plot 5: {e}")
+
 
 # 6. Dominance Spectrum
-try:
+def plot_dominance_spectrum(df02):
     sample_districts = df02.sample(min(10, len(df02)), random_state=42)['district'].tolist()
     comp_data = df02[df02['district'].isin(sample_districts)][['district', 'enrollment_ratio', 'biometric_ratio', 'demographic_ratio']]
     comp_data.set_index('district', inplace=True)
@@ -131,26 +146,18 @@ try:
     plt.ylabel('Ratio')
     plt.legend(loc='upper right')
     plt.tight_layout()
-    plt.savefig('visuals/06_dominance_spectrum.png')
-    print('Saved 06_dominance_spectrum.png')
-    plt.close()
-except Exception as e:
-    print(f"Error Plot 6: {e}")
+
 
 # 7. Action Allocation Donut
-try:
+def plot_action_allocation(df06):
     action_counts = df06['recommended_action'].value_counts()
     plt.figure(figsize=(7, 7))
     plt.pie(action_counts, labels=action_counts.index, autopct='%1.1f%%', startangle=140, colors=sns.color_palette('pastel'))
     plt.title('Strategic Resource Allocation Plan', fontsize=14, fontweight='bold')
-    plt.savefig('visuals/07_action_allocation.png')
-    print('Saved 07_action_allocation.png')
-    plt.close()
-except Exception as e:
-    print(f"Error Plot 7: {e}")
+
 
 # 8. Risk Density
-try:
+def plot_risk_density(df_full):
     plt.figure(figsize=(8, 5))
     sns.kdeplot(df_full['pressure_index'], shade=True, color='r')
     plt.axvline(x=0.75, color='black', linestyle='--', label='Critical Threshold')
@@ -158,14 +165,10 @@ try:
     plt.xlabel('Pressure Index')
     plt.legend()
     plt.tight_layout()
-    plt.savefig('visuals/08_risk_density.png')
-    print('Saved 08_risk_density.png')
-    plt.close()
-except Exception as e:
-    print(f"Error Plot 8: {e}")
+
 
 # 9. Top 10 Critical
-try:
+def plot_top_10_critical(df_full):
     top_10 = df_full.nlargest(10, 'pressure_index')
     plt.figure(figsize=(10, 6))
     sns.barplot(data=top_10, y='district', x='pressure_index', palette='Reds_r')
@@ -173,23 +176,122 @@ try:
     plt.axvline(x=0.75, color='black', linestyle='--')
     plt.xlim(0, 1.1)
     plt.tight_layout()
-    plt.savefig('visuals/09_top_10_critical.png')
-    print('Saved 09_top_10_critical.png')
-    plt.close()
-except Exception as e:
-    print(f"Error Plot 9: {e}")
+
 
 # 10. Stress by Typology
-try:
+def plot_typology_stress(df_full):
     plt.figure(figsize=(10, 6))
     sns.boxplot(data=df_full, x='classification', y='pressure_index', palette='Set2')
     plt.title('Stress Distribution by Operational Zone', fontsize=14, fontweight='bold')
     plt.xticks(rotation=15)
     plt.tight_layout()
-    plt.savefig('visuals/10_typology_stress.png')
-    print('Saved 10_typology_stress.png')
-    plt.close()
-except Exception as e:
-    print(f"Error Plot 10: {e}")
 
-print("Visual Generation Complete.")
+
+# (plot number, filename, draw function, input frames)
+PLOTS = [
+    (1, '01_crisis_quadrant.png', plot_crisis_quadrant, ['df_full']),
+    (2, '02_typology_matrix.png', plot_typology_matrix, ['df_full']),
+    (3, '03_pressure_distribution.png', plot_pressure_distribution, ['df_full']),
+    (4, '04_volatility_pulse.png', plot_volatility_pulse, ['df03', 'monthly']),
+    (5, '05_seasonality_heatmap.png', plot_seasonality_heatmap, ['df03', 'monthly']),
+    (6, '06_dominance_spectrum.png', plot_dominance_spectrum, ['df02']),
+    (7, '07_action_allocation.png', plot_action_allocation, ['df06']),
+    (8, '08_risk_density.png', plot_risk_density, ['df_full']),
+    (9, '09_top_10_critical.png', plot_top_10_critical, ['df_full']),
+    (10, '10_typology_stress.png', plot_typology_stress, ['df_full']),
+]
+
+
+def input_hash(func, frames):
+    """Hash of a plot's drawing code and the frames it is drawn from."""
+    parts = [dag.source_hash(func)] + [dag.fingerprint_frame(df) for df in frames]
+    return dag.hash_parts(*parts)
+
+
+def recorded_hash(path):
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            return img.text.get(HASH_KEY)
+    except (OSError, AttributeError):
+        return None
+
+
+def render(number, path, func, frames, digest):
+    """Draw one figure and save it with its input hash; returns a status line."""
+    load_plotting()
+    try:
+        with instrument.stage(f"plot.{path}", rows_in=sum(len(df) for df in frames)) as record:
+            plt.close('all')
+            func(*frames)
+            plt.savefig(path, metadata={HASH_KEY: digest})
+            record['bytes_written'] = os.path.getsize(path)
+        return f"Saved {path}"
+    except Exception as e:
+        return f"Error Plot {number}: {e}"
+    finally:
+        plt.close('all')
+
+
+def plan(data, out_dir, force=False):
+    """Render jobs for one figure set, skipping figures whose inputs are unchanged."""
+    os.makedirs(out_dir, exist_ok=True)
+    jobs, skipped = [], 0
+    for number, filename, func, inputs in PLOTS:
+        frames = [data[name] for name in inputs]
+        path = os.path.join(out_dir, filename)
+        digest = input_hash(func, frames)
+        if not force and recorded_hash(path) == digest:
+            skipped += 1
+            continue
+        jobs.append((number, path, func, frames, digest))
+    return jobs, skipped
+
+
+def run(data, out_dir='visuals', states=(), workers=1, force=False):
+    """Render the national set into ``out_dir`` and one set per state under it."""
+    sets = [(out_dir, data)] + [(os.path.join(out_dir, state), state_subset(data, state)) for state in states]
+    jobs, skipped = [], 0
+    with instrument.stage('plan') as record:
+        for directory, subset in sets:
+            set_jobs, set_skipped = plan(subset, directory, force)
+            jobs += set_jobs
+            skipped += set_skipped
+        record['skipped'] = skipped
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            messages = list(pool.map(render, *zip(*jobs)))
+    else:
+        messages = [render(*job) for job in jobs]
+    for message in messages:
+        print(message)
+    print(f"Rendered {len(jobs)} figures, skipped {skipped} unchanged.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render strategic visuals from the pipeline outputs")
+    parser.add_argument('--workers', type=int, default=1, help="render figures in this many processes")
+    parser.add_argument('--by-state', action='store_true', help="also render one figure set per state into visuals/<state>/")
+    parser.add_argument('--force', action='store_true', help="re-render even when a figure's inputs are unchanged")
+    parser.add_argument('--out', default='visuals', help="output directory (default: visuals)")
+    args = parser.parse_args(argv)
+
+    print("Starting Visual Generation...")
+
+    # Load Data
+    try:
+        with instrument.stage('load_data'):
+            data = load_data()
+        print("Data Loaded Successfully.")
+    except Exception as e:
+        print(f"Data Load Error: {e}")
+        return
+
+    states = sorted(data['df_full']['state'].unique()) if args.by_state else []
+    run(data, args.out, states, args.workers, args.force)
+    print("Visual Generation Complete.")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
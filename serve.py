@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+from urllib.parse import parse_qs, urlsplit
+
+import storage
+
+# Local HTTP query service over the pipeline outputs (03, 04 and 06).
+#
+# Outputs are loaded once into an in-memory index keyed by (state, district),
+# with every record pre-serialized to JSON, a pressure_index ranking for top-N
+# queries and per-tier / per-typology key lists for filters. A background task
+# watches the output files and builds a fresh index once they have changed and
+# then stayed unchanged for a whole check interval, so a pipeline run that is
+# still replacing 03/04/06 is not picked up halfway. The new index replaces
+# the old one in a single assignment, so requests always see a complete
+# snapshot.
+#
+#   GET /health
+#   GET /district?state=Delhi&district=East%20Delhi
+#   GET /top?n=10
+#   GET /districts?tier=High%20Stress&typology=Migration%20Impact%20Zone
+
+SOURCE_TABLES = ['03_output', '04_output', '06_output']
+
+
+def _clean(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+class OutputIndex:
+    """Immutable snapshot of the pipeline outputs, indexed for point and filter queries."""
+
+    def __init__(self, directory=""):
+        df = storage.read_table('03_output', directory=directory)
+        df = df.merge(storage.read_table('04_output', columns=['state', 'district', 'typology', 'child_ratio', 'adult_ratio'],
+                                         directory=directory), on=['state', 'district'], how='left')
+        df = df.merge(storage.read_table('06_output', columns=['state', 'district', 'recommended_action', 'rationale'],
+                                         directory=directory), on=['state', 'district'], how='left')
+        df = df.sort_values('pressure_index', ascending=False, kind='stable')
+
+        self.by_key = {}
+        self.ranked = []
+        self.by_tier = {}
+        self.by_typology = {}
+        columns = list(df.columns)
+        for values in df.itertuples(index=False, name=None):
+            record = {c: _clean(v) for c, v in zip(columns, values)}
+            key = (record['state'], record['district'])
+            body = json.dumps(record).encode()
+            self.by_key[key] = body
+            self.ranked.append(body)
+            self.by_tier.setdefault(record['pressure_tier'], []).append(key)
+            self.by_typology.setdefault(record['typology'], []).append(key)
+
+    def __len__(self):
+        return len(self.by_key)
+
+    def district(self, state, district):
+        return self.by_key.get((state, district))
+
+    def top(self, n):
+        return b'[' + b','.join(self.ranked[:n]) + b']'
+
+    def filter(self, tier=None, typology=None):
+        """Records matching every given filter, in pressure_index order."""
+        keys = None
+        for index, value in ((self.by_tier, tier), (self.by_typology, typology)):
+            if value is None:
+                continue
+            matches = index.get(value, [])
+            if keys is None:
+                keys = matches
+            else:
+                allowed = set(matches)
+                keys = [k for k in keys if k in allowed]
+        if keys is None:
+            return self.top(len(self.ranked))
+        return b'[' + b','.join(self.by_key[k] for k in keys) + b']'
+
+
+def source_signature(directory=""):
+    """(path, mtime, size) of each source table, used to detect new outputs."""
+    signature = []
+    for name in SOURCE_TABLES:
+        _, path = storage.find_table(name, directory=directory)
+        st = os.stat(path)
+        signature.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+class QueryService:
+    def __init__(self, directory="", reload_interval=2.0):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self.signature = source_signature(directory)
+        self.index = OutputIndex(directory)
+
+    async def watch(self):
+        """Rebuild the index off the event loop once the output files have changed and settled."""
+        loop = asyncio.get_running_loop()
+        pending = None
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                signature = source_signature(self.directory)
+                if signature == self.signature or signature != pending:
+                    # Unchanged, or still changing: check again next interval
+                    pending = None if signature == self.signature else signature
+                    continue
+                index = await loop.run_in_executor(None, OutputIndex, self.directory)
+                if source_signature(self.directory) != signature:
+                    continue
+            except Exception as e:
+                # Half-written or missing outputs: keep serving the last good snapshot
+                print(f"Reload skipped: {e}")
+                continue
+            self.index, self.signature, pending = index, signature, None
+            print(f"Reloaded {len(index)} districts")
+
+    def respond(self, target):
+        """(status, body) for a request target such as '/top?n=5'."""
+        url = urlsplit(target)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        index = self.index
+        if url.path == '/health':
+            return 200, json.dumps({'status': 'ok', 'districts': len(index)}).encode()
+        if url.path == '/district':
+            body = index.district(params.get('state'), params.get('district'))
+            return (200, body) if body is not None else (404, b'{"error": "unknown district"}')
+        if url.path == '/top':
+            try:
+                n = int(params.get('n', 10))
+            except ValueError:
+                n = -1
+            if n < 0:
+                return 400, b'{"error": "n must be a non-negative integer"}'
+            return 200, index.top(n)
+        if url.path == '/districts':
+            return 200, index.filter(params.get('tier'), params.get('typology'))
+        return 404, b'{"error": "not found"}'
+
+    async def handle(self, reader, writer):
+        """Serve HTTP/1.1 GET requests on one keep-alive connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = True
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    if header.lower().startswith(b'connection:') and b'close' in header.lower():
+                        keep_alive = False
+                parts = request_line.decode('latin-1').split()
+                if len(parts) < 2 or parts[0] != 'GET':
+                    status, body = 405, b'{"error": "only GET is supported"}'
+                else:
+                    status, body = self.respond(parts[1])
+                reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}[status]
+                writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n'
+                             % (status, reason.encode(), len(body)) + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        server = await asyncio.start_server(self.handle, host, port)
+        watcher = asyncio.create_task(self.watch())
+        print(f"Serving {len(self.index)} districts on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve pressure index, typology and recommendations over local HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--dir', default="", help="directory holding the pipeline outputs")
+    parser.add_argument('--reload-interval', type=float, default=2.0, help="seconds between checks for new outputs")
+    args = parser.parse_args(argv)
+
+    asyncio.run(QueryService(args.dir, args.reload_interval).serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
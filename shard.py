@@ -0,0 +1,181 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+import instrument
+import partitioned
+import run_01_prep
+import run_pipeline
+import stages
+import storage
+
+# Sharded execution of stages 02-06 by state.
+#
+# A worker takes every n-th FILE_MAP state, prepares each state's
+# district_monthly frames from its raw files (run_01_prep) and reduces them
+# with partitioned.state_results to per-district partials: category volumes,
+# volume / std / growth moments, age sums and spikes, one row per district
+# (plus one per spike). These go to <out>/shard-<i>-of-<n>/ with a
+# partial.json manifest holding the shard's states, row counts and the min/max
+# of the stage 03 features. The manifest is written last, so a partial is
+# complete once it exists.
+#
+# Districts never span states, so the coordinator merges partials by
+# concatenation, combines the min/max sketches into the global bounds and runs
+# the global steps (normalization, 04/06 joins) exactly as the partitioned
+# backend does, giving the same 02-06 outputs as a single-node run. Workers
+# only need the shared output directory, so they can run on separate machines.
+#
+#   python shard.py worker --shard 0 --shards 4      # on each node, i = 0..3
+#   python shard.py merge --verify                   # once all partials exist
+#   python shard.py run --shards 4                   # both, with local worker processes
+
+DEFAULT_OUT = 'shards'
+MANIFEST = 'partial.json'
+
+
+def shard_states(shard, shards):
+    return list(run_01_prep.FILE_MAP)[shard::shards]
+
+
+def partial_dir(out_dir, shard, shards):
+    return os.path.join(out_dir, f"shard-{shard:03d}-of-{shards:03d}")
+
+
+def load_state_frames(state, chunksize=None):
+    """One state's district_monthly frames per category, prepared from its raw files."""
+    frames = {}
+    for category_name in run_01_prep.CATEGORY_OUTPUTS:
+        grouped = run_01_prep.load_state_category(state, category_name, chunksize)
+        frames[category_name.lower()] = partitioned.empty_monthly() if grouped is None else grouped[run_01_prep.OUTPUT_COLS]
+    return frames
+
+
+def write_partial(out_dir, shard, shards, chunksize=None):
+    """Reduce this shard's states to per-district partials; returns the partial directory."""
+    states = shard_states(shard, shards)
+    parts = {}
+    for state in states:
+        with instrument.stage(f"shard.{state}"):
+            for name, df in partitioned.state_results(load_state_frames(state, chunksize)).items():
+                parts.setdefault(name, []).append(df)
+
+    directory = partial_dir(out_dir, shard, shards)
+    os.makedirs(directory, exist_ok=True)
+    tables = {}
+    for name, dfs in parts.items():
+        df = pd.concat([df for df in dfs if len(df)] or dfs[:1], ignore_index=True)
+        storage.write_table(df, name, directory=directory)
+        tables[name] = len(df)
+    metrics = pd.concat(parts['metrics']) if parts else pd.DataFrame(columns=list(stages.PRESSURE_WEIGHTS))
+    mins, maxes = stages.feature_bounds(metrics)
+    manifest = {
+        'shard': shard, 'shards': shards, 'states': states, 'tables': tables,
+        'bounds': {feature: [lo, hi] for feature, lo, hi in zip(stages.PRESSURE_WEIGHTS, mins.tolist(), maxes.tolist())},
+    }
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return directory
+
+
+def load_partials(out_dir):
+    """(state_results frames by name, merged feature bounds) from every complete partial under ``out_dir``."""
+    manifests = []
+    for path in sorted(glob.glob(os.path.join(out_dir, 'shard-*', MANIFEST))):
+        with open(path) as f:
+            manifests.append((os.path.dirname(path), json.load(f)))
+    if not manifests:
+        raise FileNotFoundError(f"No shard partials under {os.path.abspath(out_dir)}")
+
+    shards = {m['shards'] for _, m in manifests}
+    if len(shards) != 1:
+        raise ValueError(f"Partials from runs with different shard counts {sorted(shards)} in {out_dir}")
+    missing = set(range(shards.pop())) - {m['shard'] for _, m in manifests}
+    if missing:
+        raise ValueError(f"Missing partials for shards {sorted(missing)}")
+    states = [state for _, m in manifests for state in m['states']]
+    if len(states) != len(set(states)):
+        raise ValueError("A state appears in more than one partial")
+
+    parts = {}
+    for directory, manifest in manifests:
+        for name in manifest['tables']:
+            parts.setdefault(name, []).append(storage.read_table(name, directory=directory))
+    bounds = np.array([[manifest['bounds'][f] for f in stages.PRESSURE_WEIGHTS] for _, manifest in manifests])
+    return parts, (bounds[:, :, 0].min(axis=0), bounds[:, :, 1].max(axis=0))
+
+
+def merge(out_dir):
+    """Coded stage results and DistrictIndex from the partials under ``out_dir``."""
+    parts, bounds = load_partials(out_dir)
+    if not parts:
+        raise ValueError(f"Partials under {out_dir} hold no data")
+    return partitioned.merge(parts, bounds)
+
+
+def write_outputs(results, index, verify=False):
+    for stage, (_, node, _, _) in run_pipeline.STAGES.items():
+        if node in results:
+            run_pipeline.write_stage(stage, results, index)
+    if not verify:
+        return 0
+    problems = run_pipeline.verify_backend(results, index)
+    if problems:
+        print("Verification FAILED:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    print("Verification passed: merged shard outputs match the single-node pipeline.")
+    return 0
+
+
+def run_local(out_dir, shards, chunksize=None):
+    """Run every shard's worker as a local process over the shared ``out_dir``; returns failed shard ids."""
+    for stale in glob.glob(os.path.join(out_dir, 'shard-*')):
+        shutil.rmtree(stale)
+    args = ['--out', out_dir, '--shards', str(shards)] + (['--chunksize', str(chunksize)] if chunksize else [])
+    procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', '--shard', str(i), *args],
+                              stdout=subprocess.DEVNULL) for i in range(shards)]
+    return [i for i, proc in enumerate(procs) if proc.wait() != 0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run stages 02-06 sharded by state with a merge step")
+    commands = parser.add_subparsers(dest='command', required=True)
+    worker = commands.add_parser('worker', help="reduce one shard's states to a partial")
+    worker.add_argument('--shard', type=int, required=True)
+    run = commands.add_parser('run', help="run all workers as local processes, then merge")
+    merge_cmd = commands.add_parser('merge', help="merge the partials and write the outputs")
+    for sub in (worker, run, merge_cmd):
+        sub.add_argument('--out', default=DEFAULT_OUT, help="shared directory for the partials")
+    for sub in (worker, run):
+        sub.add_argument('--shards', type=int, required=True, help="total number of shards")
+        sub.add_argument('--chunksize', type=int, default=None, help="stream raw files in chunks of this many rows")
+    for sub in (run, merge_cmd):
+        sub.add_argument('--verify', action='store_true',
+                         help="also run the single-node pipeline over the district_monthly tables and compare")
+    args = parser.parse_args(argv)
+
+    if args.command == 'worker':
+        if not 0 <= args.shard < args.shards:
+            parser.error(f"--shard must be in 0..{args.shards - 1}")
+        print(f"Wrote {write_partial(args.out, args.shard, args.shards, args.chunksize)}")
+        return 0
+    if args.command == 'run':
+        failed = run_local(args.out, args.shards, args.chunksize)
+        if failed:
+            print(f"Shards {failed} failed")
+            return 1
+    results, index = merge(args.out)
+    return write_outputs(results, index, args.verify)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+import keys
+import stages
+
+# Stage 05 spike engine: robust per-category spike detection for every
+# district at once.
+#
+# Each category's series (plus the combined total) becomes a row of a
+# (series x periods) matrix, as in stages.series_matrix. Two baselines are
+# computed for every cell from sliding windows over that matrix:
+#   - rolling: median and MAD of the previous `window` periods
+#   - seasonal: the same period one season earlier, adjusted by the median
+#     of recent year-over-year changes, with their MAD as the scale
+# The robust z-score is (value - baseline) / (1.4826 * MAD), falling back to
+# the mean absolute deviation when MAD is 0. Short windows of counts often
+# have a MAD far below their sampling noise, so the scale is floored at
+# COUNT_NOISE * sqrt(expected count) (and at least one transaction); for the
+# seasonal baseline the expected count is that of both months compared.
+# District-months without a row are unknown rather than zero demand: they
+# are NaN and skipped by the windows. Likewise the combined total only covers
+# a district's months with rows in every category it reports at all, so a
+# month missing from one table (as 2025-08 is from enrollment/demographic)
+# does not enter the baselines as a drop in total demand.
+# Windows are sorted in blocks of series, so medians need no Python loop and
+# memory stays bounded. Cells whose z-score exceeds the threshold become rows
+# of a long table: district, period, category, baseline, value, expected, z.
+#
+# The periods can be any integer ordinal (months in the pipeline; days in
+# bench_spikes.py, with window=28 and season=364).
+
+SPIKE_WINDOW = 6
+SEASON = 12
+MIN_PERIODS = 3
+Z_THRESHOLD = 3.5
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+MIN_SCALE = 1.0
+COUNT_NOISE = 1.5
+SERIES = stages.CATEGORIES + ['total']
+BASELINES = ['rolling', 'seasonal']
+SPIKE_COLS = stages.MONTH_KEYS + ['category', 'baseline', 'value', 'expected', 'robust_z']
+BLOCK_CELLS = 8_000_000
+
+
+def _sorted_median(s, k):
+    """Median of the first k values along the last axis of NaN-last sorted windows."""
+    last = s.shape[-1] - 1
+    lo = np.take_along_axis(s, np.clip((k - 1) // 2, 0, last)[..., None], axis=-1)[..., 0]
+    hi = np.take_along_axis(s, np.clip(k // 2, 0, last)[..., None], axis=-1)[..., 0]
+    return np.where(k > 0, (lo + hi) / 2, np.nan)
+
+
+def rolling_baseline(y, window, min_periods=MIN_PERIODS):
+    """(median, robust scale) of each cell's previous ``window`` values, NaN with fewer than min_periods."""
+    n, t = y.shape
+    median = np.full((n, t), np.nan)
+    scale = np.full((n, t), np.nan)
+    if not n or not t:
+        return median, scale
+    # Window t of the padded matrix covers y[:, t - window:t]
+    padded = np.concatenate([np.full((n, window), np.nan), y[:, :-1]], axis=1)
+    view = np.lib.stride_tricks.sliding_window_view(padded, window, axis=1)
+    block = max(1, BLOCK_CELLS // (t * window))
+    for start in range(0, n, block):
+        rows = slice(start, start + block)
+        w = np.sort(view[rows], axis=2)
+        k = (~np.isnan(w)).sum(axis=2)
+        med = _sorted_median(w, k)
+        dev = np.sort(np.abs(w - med[..., None]), axis=2)
+        mad = _sorted_median(dev, k)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_ad = np.nansum(dev, axis=2) / k
+        spread = np.where(mad > 0, MAD_SCALE * mad, MEAN_AD_SCALE * mean_ad)
+        enough = k >= min_periods
+        median[rows] = np.where(enough, med, np.nan)
+        scale[rows] = np.where(enough, np.maximum(spread, MIN_SCALE), np.nan)
+    return median, scale
+
+
+def count_noise(expected):
+    """Scale floor for counts around ``expected``: a multiple of their Poisson standard deviation."""
+    with np.errstate(invalid='ignore'):
+        return np.maximum(COUNT_NOISE * np.sqrt(np.maximum(expected, 0)), MIN_SCALE)
+
+
+def baselines(y, window=SPIKE_WINDOW, season=SEASON, min_periods=MIN_PERIODS):
+    """Baseline name -> (expected value, robust z-score) matrices shaped like ``y``."""
+    median, scale = rolling_baseline(y, window, min_periods)
+    scale = np.maximum(scale, count_noise(median))
+    lagged = np.full_like(y, np.nan)
+    lagged[:, season:] = y[:, :-season]
+    change = y - lagged
+    change_median, change_scale = rolling_baseline(change, window, min_periods)
+    change_scale = np.maximum(change_scale, count_noise(median + lagged))
+    return {
+        'rolling': (median, (y - median) / scale),
+        'seasonal': (lagged + change_median, (change - change_median) / change_scale),
+    }
+
+
+def spike_table(frames, period=keys.MONTH_ID, window=SPIKE_WINDOW, season=SEASON, threshold=Z_THRESHOLD,
+                min_periods=MIN_PERIODS):
+    """Long spike table for coded frames (series name -> rows of district id, ``period``, total).
+
+    One row per (district, period, series, baseline) whose robust z-score
+    exceeds ``threshold``, ordered by district, series, period and baseline.
+    """
+    names = list(frames)
+    periods = np.concatenate([df[period].to_numpy() for df in frames.values()]).astype(np.intp)
+    if not len(periods):
+        return _empty(period)
+    n = max(int(df[keys.ID].max()) + 1 for df in frames.values() if len(df))
+    first, last = periods.min(), periods.max()
+    y = np.concatenate([stages.series_matrix(df, n, first, last - first + 1, period, fill_gaps=False)
+                        for df in frames.values()])
+
+    parts = []
+    for b, (expected, z) in enumerate(baselines(y, window, season, min_periods).values()):
+        with np.errstate(invalid='ignore'):
+            series, t = np.nonzero(z > threshold)
+        parts.append((series, t, np.full(len(t), b), y[series, t], expected[series, t], z[series, t]))
+    series, t, baseline, value, expected, z = (np.concatenate(cols) for cols in zip(*parts))
+
+    category, district = np.divmod(series, n)
+    order = np.lexsort((baseline, t, category, district))
+    return pd.DataFrame({
+        keys.ID: district[order].astype(np.int32),
+        period: (t[order] + first).astype(np.int16 if period == keys.MONTH_ID else np.int32),
+        'category': pd.Categorical.from_codes(category[order], categories=names),
+        'baseline': pd.Categorical.from_codes(baseline[order], categories=BASELINES),
+        'value': value[order],
+        'expected': expected[order],
+        'robust_z': z[order],
+    })
+
+
+def _empty(period):
+    return pd.DataFrame({keys.ID: pd.Series(dtype=np.int32), period: pd.Series(dtype=np.int16),
+                         'category': pd.Categorical([], categories=SERIES),
+                         'baseline': pd.Categorical([], categories=BASELINES),
+                         'value': pd.Series(dtype=float), 'expected': pd.Series(dtype=float),
+                         'robust_z': pd.Series(dtype=float)})
+
+
+def complete_months(frames):
+    """(district_id, month_id) index of the cells with a row in every frame the district appears in."""
+    per_cell = pd.concat([df[stages.MONTH_KEYS] for df in frames], ignore_index=True).groupby(stages.MONTH_KEYS).size()
+    per_district = pd.concat([df[keys.ID].drop_duplicates() for df in frames]).value_counts()
+    expected = per_district.reindex(per_cell.index.get_level_values(keys.ID)).to_numpy()
+    return per_cell.index[per_cell.to_numpy() == expected]
+
+
+def spike_stage(df_enroll, df_bio, df_demo, district_monthly):
+    """Stage 05 spike table: monthly spikes per category and in the combined total."""
+    cells = pd.MultiIndex.from_frame(district_monthly[stages.MONTH_KEYS])
+    district_monthly = district_monthly[cells.isin(complete_months([df_enroll, df_bio, df_demo]))]
+    frames = dict(zip(SERIES, [df_enroll, df_bio, df_demo, district_monthly]))
+    return spike_table({name: df[stages.MONTH_KEYS + ['total']] for name, df in frames.items()})[SPIKE_COLS]
@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+
+import keys
+import rules
+
+# Stage 02-06 computations shared by run_pipeline and the incremental updater.
+#
+# Each function takes plain frames and returns a frame; reading inputs,
+# writing outputs and error reporting stay in the calling scripts. Frames are
+# keyed by integer district_id / month_id codes (see keys.py); callers encode
+# the district_monthly inputs and decode the outputs.
+
+KEYS = [keys.ID]
+MONTH_KEYS = KEYS + [keys.MONTH_ID]
+AGE_COLS = ['age_0_5', 'age_5_17', 'age_18_plus']
+CATEGORIES = ['enrollment', 'biometric', 'demographic']
+
+# Pressure index = weighted sum of min-max normalized district metrics
+PRESSURE_WEIGHTS = {
+    'total_volume': 0.5,
+    'monthly_growth_rate': 0.3,
+    'volatility': 0.2
+}
+
+OUT_02_COLS = KEYS + ['enrollment_ratio', 'biometric_ratio', 'demographic_ratio', 'dominant_type', 'dominance_score', 'dominance_strength', 'operational_meaning']
+OUT_03_COLS = KEYS + ['pressure_index', 'pressure_tier', 'total_volume', 'monthly_growth_rate', 'volatility']
+OUT_04_COLS = KEYS + ['typology', 'child_ratio', 'adult_ratio', 'pressure_tier']
+OUT_05_COLS = KEYS + ['spike_months', 'spike_type', 'volatility']
+OUT_06_COLS = KEYS + ['classification', 'pressure_tier', 'recommended_action', 'rationale']
+
+
+# --- 02 ---
+def category_volume(df, name):
+    """Total volume per district for one service category."""
+    return df.groupby(KEYS)['total'].sum().reset_index().rename(columns={'total': f'{name}_vol'})
+
+
+def decompose_demand(a_en, a_bi, a_de):
+    """Stage 02: category ratios, dominance and operational meaning per district."""
+    master = keys.join(keys.join(a_en, a_bi), a_de)
+    master['total_volume'] = master['enrollment_vol'] + master['biometric_vol'] + master['demographic_vol']
+
+    master['enrollment_ratio'] = master['enrollment_vol'] / master['total_volume']
+    master['biometric_ratio'] = master['biometric_vol'] / master['total_volume']
+    master['demographic_ratio'] = master['demographic_vol'] / master['total_volume']
+    master['dominance_score'] = master[['enrollment_ratio', 'biometric_ratio', 'demographic_ratio']].max(axis=1)
+
+    master['dominant_type'], master['dominance_strength'] = rules.classify_dominance(master)
+    master['operational_meaning'] = rules.operational_meaning(master)
+    return master
+
+
+# --- 03 ---
+def monthly_totals(df_all):
+    """Combined service volume per district and month across categories."""
+    return df_all.groupby(MONTH_KEYS)['total'].sum().reset_index()
+
+
+def district_segments(district_monthly):
+    """Group rows by district into contiguous segments.
+
+    Returns (order, starts): ``order`` stably sorts the rows by district_id
+    (groupby order, keeping the original row order within a district) and
+    ``starts`` are the segment start offsets in that sorted order, ready for
+    np.*.reduceat segment reductions.
+    """
+    gid = district_monthly[keys.ID].to_numpy()
+    order = np.argsort(gid, kind='stable')
+    gid = gid[order]
+    starts = np.flatnonzero(np.r_[True, gid[1:] != gid[:-1]]) if len(gid) else np.empty(0, dtype=np.intp)
+    return order, starts
+
+
+def segment_growth(totals, starts):
+    """Mean month-on-month pct change per segment (Series.pct_change().mean()).
+
+    A segment's first month has no previous value, and NaN changes (0 -> 0)
+    are skipped; segments with no valid change give NaN.
+    """
+    if not len(starts):
+        return np.empty(0)
+    prev = np.r_[np.nan, totals[:-1]]
+    prev[starts] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = totals / prev - 1
+        valid = ~np.isnan(pct)
+        return np.add.reduceat(np.where(valid, pct, 0), starts) / np.add.reduceat(valid, starts)
+
+
+def district_metrics(district_monthly):
+    """Total volume, volatility (std) and mean monthly growth per district."""
+    metrics = district_monthly.groupby(KEYS)['total'].agg(total_volume='sum', volatility='std').reset_index()
+
+    order, starts = district_segments(district_monthly)
+    totals = district_monthly['total'].to_numpy(dtype=float)[order]
+    metrics['monthly_growth_rate'] = segment_growth(totals, starts)
+    metrics['monthly_growth_rate'] = metrics['monthly_growth_rate'].fillna(0)
+    return metrics
+
+
+def min_max_normalize(values, bounds=None):
+    """Scale each column to [0, 1] with sklearn MinMaxScaler's arithmetic.
+
+    Constant (zero-range) columns map to 0, as they do in MinMaxScaler.
+    ``bounds`` is an optional (column mins, column maxes) pair to scale with
+    instead of the values' own, e.g. merged from shards (see shard.py).
+    """
+    values = np.asarray(values, dtype=float)
+    if np.isinf(values).any():
+        raise ValueError("Input contains infinity")
+    data_min, data_max = (values.min(axis=0), values.max(axis=0)) if bounds is None else bounds
+    data_range = data_max - data_min
+    scale = 1.0 / np.where(data_range < 10 * np.finfo(float).eps, 1.0, data_range)
+    return values * scale + (0.0 - data_min * scale)
+
+
+def feature_bounds(metrics):
+    """(mins, maxes) of the pressure features: the only global statistic stage 03 needs.
+
+    Bounds from disjoint sets of districts merge with np.minimum/np.maximum;
+    no districts gives (inf, -inf).
+    """
+    values = metrics[list(PRESSURE_WEIGHTS)].fillna(0).to_numpy(dtype=float)
+    if not len(values):
+        return np.full(len(PRESSURE_WEIGHTS), np.inf), np.full(len(PRESSURE_WEIGHTS), -np.inf)
+    return values.min(axis=0), values.max(axis=0)
+
+
+def pressure_index(metrics, bounds=None):
+    """Stage 03: normalize district metrics and derive the pressure index and tier."""
+    cols = list(PRESSURE_WEIGHTS)
+    norm_cols = [f'norm_{c}' for c in cols]
+    metrics[norm_cols] = min_max_normalize(metrics[cols].fillna(0), bounds)
+
+    terms = [weight * metrics[f'norm_{c}'] for c, weight in PRESSURE_WEIGHTS.items()]
+    metrics['pressure_index'] = sum(terms[1:], terms[0])
+
+    metrics['pressure_tier'] = rules.classify_pressure(metrics['pressure_index'])
+    return metrics
+
+
+# --- 04 ---
+def age_sums(df_all):
+    return df_all.groupby(KEYS)[AGE_COLS + ['total']].sum().reset_index()
+
+
+def demand_typology(age_sum, metrics, master):
+    """Stage 04: child/adult demand ratios and operational typology."""
+    combined = keys.join(age_sum, metrics[KEYS + ['pressure_tier', 'volatility']])
+    combined = keys.join(combined, master[KEYS + ['dominant_type']])
+
+    combined['child_pressure'] = combined['age_0_5'] + combined['age_5_17']
+    combined['adult_pressure'] = combined['age_18_plus']
+    combined['child_ratio'] = combined['child_pressure'] / combined['total']
+    combined['adult_ratio'] = combined['adult_pressure'] / combined['total']
+
+    combined['typology'] = rules.typology(combined)
+    return combined
+
+
+# --- 05 ---
+def detect_spikes(district_monthly):
+    """Stage 05: months above mean + 2*std of each district's history.
+
+    Mean and sample std are segment reductions over the district-sorted
+    rows; one boolean mask marks every spike month, and each spiking
+    district's months are joined into the spike_months list string.
+    """
+    order, starts = district_segments(district_monthly)
+    if not len(starts):
+        return pd.DataFrame(columns=OUT_05_COLS)
+    rows = district_monthly.iloc[order]
+    totals = rows['total'].to_numpy(dtype=float)
+
+    counts = np.diff(np.r_[starts, len(totals)])
+    seg = np.repeat(np.arange(len(starts)), counts)
+    mean = np.add.reduceat(totals, starts) / counts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(np.add.reduceat((totals - mean[seg]) ** 2, starts) / (counts - 1))
+
+    spike = (totals > (mean + 2*std)[seg]) & (std != 0)[seg]
+    spike_counts = np.add.reduceat(spike, starts)
+    flagged = spike_counts > 0
+
+    # str(list_of_months) for each flagged district, built by segment concatenation
+    quoted = ("'" + keys.month_labels(rows[keys.MONTH_ID].to_numpy()[spike]) + "', ").astype(object)
+    spike_starts = np.r_[0, np.cumsum(spike_counts[flagged])[:-1]]
+    joined = np.add.reduceat(quoted, spike_starts) if len(quoted) else np.empty(0, dtype=object)
+
+    first = rows.iloc[starts[flagged]]
+    return pd.DataFrame({
+        keys.ID: first[keys.ID].to_numpy(),
+        'spike_months': ['[' + s[:-2] + ']' for s in joined],
+        'spike_type': np.where(spike_counts[flagged] > 1, 'Seasonal Pattern', 'Irregular/Migration'),
+        'volatility': std[flagged]
+    })
+
+
+def series_matrix(df, n_series, first_month, n_months, period=keys.MONTH_ID, fill_gaps=True):
+    """(districts x months) float matrix of ``total`` from coded district_monthly rows.
+
+    ``period`` names the integer time column, for series at other granularities.
+    Months with no rows for any district are missing from the extract and NaN,
+    not zero demand. A district's own gaps after its first record count as
+    zero demand, or as NaN too with ``fill_gaps=False``. Used by the spike
+    engine (spikes.py, with ``fill_gaps=False``) and the stage 07 forecasts.
+    """
+    y = np.zeros((n_series, n_months))
+    observed = np.zeros((n_series, n_months), dtype=bool)
+    rows = df[keys.ID].to_numpy()
+    cols = df[period].to_numpy().astype(np.intp) - first_month
+    np.add.at(y, (rows, cols), df['total'].to_numpy(dtype=float))
+    observed[rows, cols] = True
+    # Months before a district's first record are unknown; later gaps had no demand
+    y[~np.logical_or.accumulate(observed, axis=1) if fill_gaps else ~observed] = np.nan
+    y[:, ~observed.any(axis=0)] = np.nan
+    return y
+
+
+# --- 06 ---
+def policy_recommendations(out_04, metrics, master):
+    """Stage 06: recommended action and rationale per district."""
+    merged = keys.join(out_04, metrics[KEYS + ['volatility']])
+    merged = keys.join(merged, master[KEYS + ['dominance_strength', 'dominant_type']])
+
+    merged['recommended_action'], merged['rationale'] = rules.recommend(merged)
+
+    # FIX: Select 'typology' then rename
+    out_06 = merged[KEYS + ['typology', 'pressure_tier', 'recommended_action', 'rationale']]
+    return out_06.rename(columns={'typology': 'classification'})
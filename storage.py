@@ -0,0 +1,201 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+# Intermediate table storage shared by run_01_prep, run_pipeline and run_visuals.
+#
+# Tables are addressed by name (e.g. "district_monthly_enrollment", "03_output")
+# and saved as <name>.<ext> in the working directory. Columnar formats store a
+# typed schema: text columns dictionary-encoded, counts as int32 and `month`
+# as a monthly Period. Readers get back the same logical frame a CSV read
+# would give, so stage code does not care which format is in use.
+#
+# A table may exist in several formats (an older run, a CSV written by a
+# notebook); readers always take the most recently written copy. The final
+# 02-07 outputs are written as CSV (OUTPUT_FORMAT) whatever the default, since
+# the notebooks and the brief read them directly.
+#
+# append_table adds rows without rewriting the table: CSV files are appended
+# in place, columnar ones get a numbered part file (<name>.part-<n>.<ext>)
+# that readers concatenate after the base. write_table replaces the base and
+# drops its parts.
+
+FORMAT_EXTENSIONS = {
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+    "csv": ".csv"
+}
+
+OUTPUT_FORMAT = "csv"
+
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+
+def _columnar_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def default_format():
+    """Storage format from $AADHAAR_STORAGE, else Parquet when pyarrow is installed."""
+    fmt = os.environ.get("AADHAAR_STORAGE")
+    if fmt:
+        if fmt not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unknown storage format '{fmt}', expected one of {list(FORMAT_EXTENSIONS)}")
+        return fmt
+    return "parquet" if _columnar_available() else "csv"
+
+
+def table_path(name, fmt=None, directory=""):
+    return os.path.join(directory, name + FORMAT_EXTENSIONS[fmt or default_format()])
+
+
+def encode_frame(df):
+    """Convert a frame to the typed columnar schema."""
+    out = df.copy()
+    for col in out.columns:
+        values = out[col]
+        if col == "month":
+            # Parse each distinct month once rather than once per row
+            codes, uniques = pd.factorize(values, use_na_sentinel=False)
+            out[col] = pd.PeriodIndex(uniques, freq="M")[codes].array
+        elif pd.api.types.is_integer_dtype(values):
+            if len(values) == 0 or (values.min() >= INT32_MIN and values.max() <= INT32_MAX):
+                out[col] = values.astype(np.int32)
+        elif pd.api.types.is_string_dtype(values) or values.dtype == object:
+            out[col] = values.astype("category")
+    return out
+
+
+def decode_frame(df):
+    """Convert a typed columnar frame back to the plain CSV-equivalent schema."""
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.PeriodDtype):
+            # Format each distinct month once rather than once per row
+            codes, uniques = pd.factorize(values, use_na_sentinel=False)
+            df[col] = uniques.strftime("%Y-%m").to_numpy(dtype=object)[codes]
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            df[col] = values.astype(values.cat.categories.dtype)
+        elif pd.api.types.is_integer_dtype(values):
+            df[col] = values.astype(np.int64)
+    return df
+
+
+def write_table(df, name, fmt=None, directory=""):
+    """Save ``df`` as table ``name`` and return the path written."""
+    fmt = fmt or default_format()
+    path = table_path(name, fmt, directory)
+    # Write beside the target and rename, so readers never see a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if fmt == "csv":
+        df.to_csv(tmp, index=False)
+    elif fmt == "parquet":
+        encode_frame(df).to_parquet(tmp, index=False)
+    else:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        table = pa.Table.from_pandas(encode_frame(df), preserve_index=False)
+        feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+    for part in table_parts(name, fmt, directory):
+        os.remove(part)
+    instrument.count(rows_out=len(df), bytes_written=os.path.getsize(path))
+    return path
+
+
+def table_parts(name, fmt, directory=""):
+    """Paths of the part files appended to table ``name`` in ``fmt``, in append order."""
+    ext = FORMAT_EXTENSIONS[fmt]
+    paths = glob.glob(os.path.join(glob.escape(directory), glob.escape(name) + ".part-*" + ext))
+    return sorted(paths, key=lambda p: int(p[:-len(ext)].rsplit(".part-", 1)[1]))
+
+
+def append_table(df, name, directory=""):
+    """Add the rows of ``df`` to table ``name`` without rewriting it; return the path written.
+
+    Rows go to the table's most recently written copy (see find_table), in
+    its column order; a table that does not exist yet is created.
+    """
+    try:
+        fmt, path = find_table(name, directory=directory)
+    except FileNotFoundError:
+        return write_table(df, name, directory=directory)
+    existing = _columns(fmt, path)
+    if set(existing) != set(df.columns):
+        raise ValueError(f"Cannot append to '{name}': columns {sorted(df.columns)} "
+                         f"do not match the stored {sorted(existing)}")
+    df = df[existing]
+    if fmt == "csv":
+        size = os.path.getsize(path)
+        df.to_csv(path, mode="a", header=False, index=False)
+        instrument.count(rows_out=len(df), bytes_written=os.path.getsize(path) - size)
+        return path
+    parts = table_parts(name, fmt, directory)
+    n = int(parts[-1][:-len(FORMAT_EXTENSIONS[fmt])].rsplit(".part-", 1)[1]) + 1 if parts else 1
+    return write_table(df, f"{name}.part-{n}", fmt, directory)
+
+
+def find_table(name, fmt=None, directory=""):
+    """(format, path) of table ``name`` in ``fmt``, or of its most recently written copy in any format."""
+    candidates = [fmt] if fmt else list(FORMAT_EXTENSIONS)
+    found = []
+    for candidate in candidates:
+        if candidate != "csv" and not _columnar_available():
+            continue
+        path = table_path(name, candidate, directory)
+        if os.path.exists(path):
+            mtime = max(os.path.getmtime(p) for p in [path, *table_parts(name, candidate, directory)])
+            found.append((mtime, candidate == default_format(), candidate, path))
+    if not found:
+        raise FileNotFoundError(f"No stored table '{name}' in {os.path.abspath(directory)}")
+    _, _, candidate, path = max(found)
+    return candidate, path
+
+
+def read_table(name, columns=None, fmt=None, directory="", decode=True):
+    """Load table ``name``, reading only ``columns`` when given.
+
+    Columnar files are memory-mapped and projected, so unused columns are
+    never decoded. With ``decode=False`` the typed schema (category, int32,
+    Period) is returned as stored. Appended parts follow the base rows.
+    """
+    fmt, path = find_table(name, fmt, directory)
+    paths = [path, *table_parts(name, fmt, directory)]
+    frames = [_read(fmt, p, columns, decode) for p in paths]
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    instrument.count(rows_in=len(df), bytes_read=sum(os.path.getsize(p) for p in paths))
+    return df
+
+
+def _columns(fmt, path):
+    """Column names of a stored table, read from its header or schema only."""
+    if fmt == "csv":
+        return list(pd.read_csv(path, nrows=0).columns)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    import pyarrow as pa
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def _read(fmt, path, columns, decode):
+    if fmt == "csv":
+        return pd.read_csv(path, usecols=columns)[columns] if columns else pd.read_csv(path)
+
+    if fmt == "parquet":
+        df = pd.read_parquet(path, columns=columns, memory_map=True)
+    else:
+        import pyarrow.feather as feather
+        df = feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+    if columns:
+        df = df[columns]
+    return decode_frame(df) if decode else df
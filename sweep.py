@@ -0,0 +1,177 @@
+import argparse
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+import dag
+import rules
+import run_pipeline
+import stages
+import storage
+
+# Scenario sweep over pressure-index weights and tier thresholds.
+#
+# The min-max normalized stage 03 features are computed once (the pipeline's
+# cached `metrics` node). Each weight vector's pressure index for every
+# district is one column of a (districts x 3) @ (3 x weight vectors) product,
+# and each threshold set bins those columns into tiers by counting the
+# cutoffs a score falls below. Scenarios are the cross product of weight
+# vectors and threshold sets, evaluated in blocks so memory stays bounded.
+#
+#   python sweep.py --weight-step 0.05 --threshold-offsets -0.1 -0.05 0 0.05 0.1
+#
+# Writes sweep_scenarios (tier counts per scenario, and how many districts
+# change tier against the current configuration) and sweep_districts
+# (per-district tier shares, modal tier and its stability across scenarios).
+
+FEATURES = list(stages.PRESSURE_WEIGHTS)
+TIERS = [label for label, _ in rules.PRESSURE_TIER_RULES] + [rules.PRESSURE_TIER_DEFAULT]
+BLOCK_CELLS = 4_000_000
+
+
+def current_thresholds():
+    """The PRESSURE_TIER_RULES cutoffs, highest tier first."""
+    cutoffs = []
+    for label, clauses in rules.PRESSURE_TIER_RULES:
+        if len(clauses) != 1 or clauses[0][:2] != ('pressure_index', '>='):
+            raise ValueError(f"Tier rule '{label}' is not a single pressure_index >= cutoff")
+        cutoffs.append(clauses[0][2])
+    return tuple(cutoffs)
+
+
+def weight_grid(step):
+    """Every weight vector on the simplex in multiples of ``step`` (each weight > 0)."""
+    parts = round(1 / step)
+    vectors = [tuple(c / parts for c in combo) for combo in itertools.product(range(1, parts), repeat=len(FEATURES))
+               if sum(combo) == parts]
+    return np.array(vectors)
+
+
+def parse_triples(values, name, descending=False):
+    """(k, 3) array from "a,b,c" strings; with ``descending`` each triple must not increase."""
+    triples = []
+    for value in values:
+        numbers = tuple(float(v) for v in value.split(','))
+        if len(numbers) != 3:
+            raise ValueError(f"{name} '{value}' must have 3 comma-separated values")
+        if descending and any(a < b for a, b in zip(numbers, numbers[1:])):
+            raise ValueError(f"{name} '{value}' must be in descending order (critical,high,moderate)")
+        triples.append(numbers)
+    return np.array(triples)
+
+
+def tier_codes(scores, thresholds):
+    """Tier index (0 = highest) for scores (n, w) under each threshold set (t, 3): shape (n, w, t).
+
+    A score's tier is the number of cutoffs it falls below, matching the
+    first-match >= rules when cutoffs are in descending order.
+    """
+    return (scores[:, :, None, None] < thresholds[None, None, :, :]).sum(axis=3).astype(np.int8)
+
+
+def evaluate(features, weights, thresholds, baseline):
+    """Tier statistics for every (weight vector, threshold set) scenario.
+
+    ``features`` is the (districts x 3) normalized matrix and ``baseline``
+    the current tier index per district. Returns per-scenario tier counts
+    and changed-vs-baseline counts (weight-major scenario order), plus
+    per-district tier counts and pressure index range.
+    """
+    n, n_tiers = len(features), len(TIERS)
+    block = max(1, BLOCK_CELLS // max(1, n * len(thresholds)))
+    scenario_counts, changed = [], []
+    district_counts = np.zeros((n, n_tiers), dtype=np.int64)
+    low = np.full(n, np.inf)
+    high = np.full(n, -np.inf)
+
+    for start in range(0, len(weights), block):
+        w = weights[start:start + block]
+        # (n x 3) @ (3 x w), accumulated term by term in stage 03's order so the
+        # current weights reproduce its pressure_index bit for bit
+        scores = features[:, :1] * w[:, 0]
+        for j in range(1, features.shape[1]):
+            scores = scores + features[:, j:j + 1] * w[:, j]
+        low = np.minimum(low, scores.min(axis=1))
+        high = np.maximum(high, scores.max(axis=1))
+
+        codes = tier_codes(scores, thresholds).reshape(n, -1)
+        onehot = codes[:, :, None] == np.arange(n_tiers, dtype=np.int8)
+        scenario_counts.append(onehot.sum(axis=0))
+        district_counts += onehot.sum(axis=1)
+        changed.append((codes != baseline[:, None]).sum(axis=0))
+
+    return np.concatenate(scenario_counts), np.concatenate(changed), district_counts, low, high
+
+
+def scenario_table(weights, thresholds, counts, changed):
+    w = np.repeat(weights, len(thresholds), axis=0)
+    t = np.tile(thresholds, (len(weights), 1))
+    table = pd.DataFrame({'scenario': np.arange(len(w))})
+    for j, feature in enumerate(FEATURES):
+        table[f'w_{feature}'] = w[:, j]
+    for j, label in enumerate(TIERS[:-1]):
+        table[f'cutoff_{label}'] = t[:, j]
+    for j, label in enumerate(TIERS):
+        table[label] = counts[:, j]
+    table['changed_vs_current'] = changed
+    return table
+
+
+def district_table(metrics, district_counts, low, high):
+    total = district_counts.sum(axis=1, keepdims=True)
+    table = metrics[stages.KEYS + ['pressure_tier']].rename(columns={'pressure_tier': 'current_tier'}).reset_index(drop=True)
+    modal = district_counts.argmax(axis=1)
+    table['modal_tier'] = np.array(TIERS, dtype=object)[modal]
+    table['stability'] = district_counts.max(axis=1) / total[:, 0]
+    table['tiers_seen'] = (district_counts > 0).sum(axis=1)
+    for j, label in enumerate(TIERS):
+        table[f'share_{label}'] = district_counts[:, j] / total[:, 0]
+    table['pressure_index_min'] = low
+    table['pressure_index_max'] = high
+    return table
+
+
+def sweep(metrics, weights, thresholds):
+    """(scenario table, district table) for coded stage 03 metrics with norm_* columns."""
+    features = metrics[[f'norm_{c}' for c in FEATURES]].to_numpy(dtype=float)
+    baseline = pd.Series(metrics['pressure_tier']).map({label: i for i, label in enumerate(TIERS)}).to_numpy(dtype=np.int8)
+    counts, changed, district_counts, low, high = evaluate(features, weights, thresholds, baseline)
+    return scenario_table(weights, thresholds, counts, changed), district_table(metrics, district_counts, low, high)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep pressure-index weights and tier thresholds in one batched pass")
+    parser.add_argument('--weights', nargs='+', metavar='V,G,S',
+                        help="weight vectors for total_volume,monthly_growth_rate,volatility (default: a grid, see --weight-step)")
+    parser.add_argument('--weight-step', type=float, default=0.05, help="grid spacing when --weights is not given")
+    parser.add_argument('--thresholds', nargs='+', metavar='C,H,M',
+                        help=f"critical,high,moderate cutoff sets (default: current {','.join(map(str, current_thresholds()))})")
+    parser.add_argument('--threshold-offsets', type=float, nargs='+', default=[0.0],
+                        help="shift every threshold set by each of these amounts")
+    parser.add_argument('--cache-dir', default=dag.DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    try:
+        weights = parse_triples(args.weights, 'weights') if args.weights else weight_grid(args.weight_step)
+        base = (parse_triples(args.thresholds, 'thresholds', descending=True) if args.thresholds
+                else np.array([current_thresholds()]))
+    except ValueError as e:
+        parser.error(str(e))
+    thresholds = np.concatenate([base + offset for offset in args.threshold_offsets])
+
+    sources, index = run_pipeline.load_sources()
+    results, _ = dag.Pipeline(run_pipeline.NODES, dag.StageCache(args.cache_dir)).run(sources, targets=['metrics'])
+    metrics = results['metrics']
+
+    start = time.perf_counter()
+    scenarios, districts = sweep(metrics, weights, thresholds)
+    elapsed = time.perf_counter() - start
+
+    print(f"Evaluated {len(scenarios)} scenarios ({len(weights)} weight vectors x {len(thresholds)} threshold sets) "
+          f"over {len(metrics)} districts in {elapsed:.3f}s")
+    print(f"Saved {storage.write_table(scenarios, 'sweep_scenarios')}")
+    print(f"Saved {storage.write_table(index.decode(districts), 'sweep_districts')}")
+    unstable = districts['stability'] < 0.5
+    print(f"{int(unstable.sum())} districts stay in their modal tier in fewer than half the scenarios")
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Seeded generator of synthetic raw UIDAI state files at national scale.
+#
+# Files follow the layout run_01_prep expects (<State>/<file>.csv per service
+# category) with the same quirks as the real uploads: typo'd enrollment
+# filenames, demo_age_17_/bio_age_17_/age_18_greater columns, DD-MM-YYYY
+# dates and inconsistently cased/padded district names. A small fraction of
+# rows can be made dirty (bad dates, blank counts). Alongside the data it
+# writes file_map.json (point $AADHAAR_FILE_MAP at it so run_01_prep picks up
+# every generated state) and manifest.json (parameters and row counts).
+#
+#   python synth.py --out synthetic --rows 1000000
+#   cd synthetic && AADHAAR_FILE_MAP=file_map.json python ../run_01_prep.py
+
+STATES = [
+    'Andhra Pradesh', 'Arunachal Pradesh', 'Assam', 'Bihar', 'Chhattisgarh', 'Goa', 'Gujarat', 'Haryana',
+    'Himachal Pradesh', 'Jharkhand', 'Karnataka', 'Kerala', 'Madhya Pradesh', 'Maharashtra', 'Manipur',
+    'Meghalaya', 'Mizoram', 'Nagaland', 'Odisha', 'Punjab', 'Rajasthan', 'Sikkim', 'Tamil Nadu', 'Telangana',
+    'Tripura', 'UP', 'Uttarakhand', 'West Bengal', 'Andaman and Nicobar Islands', 'Chandigarh',
+    'Dadra and Nagar Haveli and Daman and Diu', 'Delhi', 'Jammu and Kashmir', 'Ladakh', 'Lakshadweep', 'Puducherry',
+]
+
+# Raw column layout per category, as in the shipped state files
+CATEGORY_COLUMNS = {
+    'Enrollment': ['age_0_5', 'age_5_17', 'age_18_greater'],
+    'Demographic': ['demo_age_5_17', 'demo_age_17_'],
+    'Biometric': ['bio_age_5_17', 'bio_age_17_'],
+}
+# Share of raw rows and mean count per age column, roughly matching the samples
+CATEGORY_SHARE = {'Enrollment': 0.18, 'Demographic': 0.25, 'Biometric': 0.57}
+CATEGORY_MEANS = {'Enrollment': [5.0, 4.0, 0.5], 'Demographic': [20.0, 150.0], 'Biometric': [25.0, 35.0]}
+
+# Filename patterns; the typo'd ones are what FILE_MAP has to cope with
+FILENAME_PATTERNS = {
+    'Enrollment': ['Enrollment_{}.csv', 'Enrollemnt_{}.csv', 'Enrollement_{}.csv'],
+    'Demographic': ['Demographic_{}.csv'],
+    'Biometric': ['Biometric_{}.csv'],
+}
+
+SYLLABLES = ['ram', 'pur', 'nag', 'gar', 'abad', 'kot', 'sar', 'ganj', 'bad', 'ali', 'man', 'dar', 'vel',
+             'lur', 'kan', 'dhi', 'pat', 'na', 'ur', 'bhi', 'wa', 'ra', 'sin', 'gh', 'jal', 'an', 'mor', 'ha']
+BAD_DATES = ['31-02-2024', '00-00-0000', 'NA', '2024/13/01']
+ROWS_PER_CHUNK = 1_000_000
+
+
+def district_names(count, rng):
+    """``count`` distinct title-case district names built from syllables."""
+    names, seen = [], set()
+    while len(names) < count:
+        parts = rng.choice(SYLLABLES, size=rng.integers(2, 5))
+        name = ''.join(parts).title()
+        if rng.random() < 0.2:
+            name += ' ' + rng.choice(['North', 'South', 'East', 'West', 'Rural', 'Urban'])
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+def messy_variants(name):
+    """The raw spellings a district name appears under; run_01_prep normalises them back."""
+    return [name, name.upper(), name.lower(), f' {name}', f'{name}  ']
+
+
+def file_map(states, rng):
+    """State -> {Category -> filename}, reusing run_01_prep's names for the states it knows."""
+    from run_01_prep import FILE_MAP
+
+    mapping = {}
+    for state in states:
+        if state in FILE_MAP:
+            mapping[state] = dict(FILE_MAP[state])
+            continue
+        token = state.replace(' ', '_')
+        mapping[state] = {c: rng.choice(patterns).format(token) for c, patterns in FILENAME_PATTERNS.items()}
+    return mapping
+
+
+def build_layout(states, districts, rng):
+    """Per-state district names, pincode bases and relative load weights."""
+    n_states = len(states)
+    if districts < n_states:
+        raise ValueError(f"Need at least one district per state ({n_states}), got {districts}")
+    per_state = 1 + rng.multinomial(districts - n_states, rng.dirichlet(np.full(n_states, 2.0)))
+    names = district_names(districts, rng)
+    layout, offset = {}, 0
+    for i, (state, n) in enumerate(zip(states, per_state)):
+        layout[state] = {
+            'districts': names[offset:offset + n],
+            'pincodes': 100000 + i * 20000 + np.arange(n) * 100,
+            'weights': rng.lognormal(0.0, 0.8, size=n),
+        }
+        offset += n
+    return layout
+
+
+def generate_file(path, state, category, info, rows, days, month_factor, dirty, rng):
+    """Write ``rows`` raw rows for one (state, category) file in bounded chunks."""
+    day_index = np.arange(len(days))
+    date_strings = days.strftime('%d-%m-%Y').to_numpy(dtype=object)
+    month_of_day = (days.year - days[0].year) * 12 + days.month - days[0].month
+    variants = np.array([messy_variants(n) for n in info['districts']], dtype=object)
+    weights = info['weights'] / info['weights'].sum()
+    means = np.outer(info['weights'], CATEGORY_MEANS[category])
+
+    first = True
+    with open(path, 'w', newline='') as f:
+        for start in range(0, rows, ROWS_PER_CHUNK):
+            n = min(ROWS_PER_CHUNK, rows - start)
+            district = rng.choice(len(weights), size=n, p=weights)
+            day = np.sort(rng.choice(day_index, size=n))
+            variant = rng.choice(variants.shape[1], size=n, p=[0.8, 0.05, 0.05, 0.05, 0.05])
+            lam = means[district] * month_factor[district, month_of_day[day]][:, None]
+
+            chunk = pd.DataFrame({
+                'date': date_strings[day],
+                'state': state,
+                'district': variants[district, variant],
+                'pincode': info['pincodes'][district] + rng.integers(0, 100, size=n),
+            })
+            counts = rng.poisson(lam)
+            # A raw row records at least one transaction
+            counts[counts.sum(axis=1) == 0, -1] = 1
+            for j, col in enumerate(CATEGORY_COLUMNS[category]):
+                chunk[col] = pd.array(counts[:, j], dtype='Int64')
+
+            if dirty > 0:
+                bad = rng.random(n) < dirty
+                chunk.loc[bad, 'date'] = rng.choice(BAD_DATES, size=int(bad.sum()))
+                bad = rng.random(n) < dirty
+                chunk.loc[bad, CATEGORY_COLUMNS[category][-1]] = pd.NA
+
+            chunk.to_csv(f, header=first, index=False)
+            first = False
+
+
+def generate(out_dir, rows, states=len(STATES), districts=800, start='2022-01-01', years=3,
+             dirty=0.0, seed=0):
+    """Write a synthetic dataset of about ``rows`` raw rows under ``out_dir``; returns the manifest."""
+    rng = np.random.default_rng(seed)
+    state_names = STATES[:states]
+    days = pd.date_range(start, periods=round(365.25 * years), freq='D')
+    n_months = (days[-1].year - days[0].year) * 12 + days[-1].month - days[0].month + 1
+
+    layout = build_layout(state_names, districts, rng)
+    mapping = file_map(state_names, rng)
+    state_weight = np.array([layout[s]['weights'].sum() for s in state_names])
+
+    manifest = {'seed': seed, 'rows': rows, 'states': states, 'districts': districts, 'start': start,
+                'years': years, 'dirty': dirty, 'files': {}}
+    for category, share in CATEGORY_SHARE.items():
+        per_state = rng.multinomial(int(rows * share), state_weight / state_weight.sum())
+        for state, state_rows in zip(state_names, per_state):
+            info = layout[state]
+            # Month-level demand multipliers with occasional surges, so stage 05 has spikes to find
+            month_factor = rng.lognormal(0.0, 0.15, size=(len(info['districts']), n_months))
+            month_factor *= np.where(rng.random(month_factor.shape) < 0.02, 3.0, 1.0)
+
+            os.makedirs(os.path.join(out_dir, state), exist_ok=True)
+            relative = os.path.join(state, mapping[state][category])
+            generate_file(os.path.join(out_dir, relative), state, category, info, int(state_rows), days,
+                          month_factor, dirty, rng)
+            manifest['files'][relative] = int(state_rows)
+
+    with open(os.path.join(out_dir, 'file_map.json'), 'w') as f:
+        json.dump(mapping, f, indent=2)
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic raw UIDAI state files for benchmarking")
+    parser.add_argument('--out', default='synthetic', help="output directory")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="approximate total raw rows")
+    parser.add_argument('--states', type=int, default=len(STATES), help=f"number of states (max {len(STATES)})")
+    parser.add_argument('--districts', type=int, default=800)
+    parser.add_argument('--start', default='2022-01-01', help="first day of daily records")
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--dirty', type=float, default=0.0, help="fraction of rows with a bad date or blank count")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    manifest = generate(args.out, args.rows, args.states, args.districts, args.start, args.years, args.dirty, args.seed)
+    print(f"Wrote {sum(manifest['files'].values())} rows in {len(manifest['files'])} files under {args.out}")
@@ -0,0 +1,164 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Data quality checks for raw state files, used by run_01_prep.
+#
+# run_01_prep parses dates, counts and district names once per chunk; those
+# parsed columns are handed to chunk_masks(), which evaluates every row-level
+# check from them in one vectorized pass. A FileReport folds the per-chunk
+# masks into counts plus a few sample offending rows per check, and is
+# written to quality/<state>__<category>.json next to the outputs. Cleaning
+# is unchanged (bad dates dropped, unparseable or blank counts summed as 0,
+# missing age columns zero-filled); the report records how often it happened.
+# With a max_bad_fraction, a file whose share of flagged rows exceeds it
+# raises ValidationError as soon as enough rows have been seen.
+
+CHECKS = ['bad_date', 'blank_count', 'non_numeric', 'negative_count', 'duplicate_row', 'missing_district',
+          'unknown_district']
+# Raw columns compared by duplicate_row. A FileReport keeps the hashes of
+# every row it has seen, so a row repeating one from an earlier chunk is
+# flagged too, as it would be in a whole-file read
+DUPLICATE_COLS = ['date', 'district', 'pincode', 'age_0_5', 'age_5_17', 'age_18_plus']
+SAMPLE_ROWS = 5
+MIN_ROWS_BEFORE_ABORT = 1000
+REPORT_DIR = 'quality'
+
+
+class ValidationError(ValueError):
+    """A raw file has more flagged rows than the fail-fast threshold allows."""
+
+
+def load_known_districts(path):
+    """State -> set of normalized district names from a CSV with state and district columns."""
+    df = pd.read_csv(path, usecols=['state', 'district'], dtype=str)
+    df['district'] = df['district'].str.strip().str.title()
+    return {state: set(group) for state, group in df.groupby('state')['district']}
+
+
+def _blank_strings(values):
+    """True where a text column is missing or whitespace, tested once per distinct value."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    blank = np.array([pd.isna(u) or not str(u).strip() for u in uniques], dtype=bool)
+    return blank[codes]
+
+
+def duplicate_rows(raw, seen):
+    """True for rows whose DUPLICATE_COLS values are already in ``seen`` or earlier in ``raw``.
+
+    ``seen`` is a set of row hashes from previous chunks; this chunk's are added to it.
+    """
+    hashes = pd.util.hash_pandas_object(raw[[c for c in DUPLICATE_COLS if c in raw.columns]], index=False)
+    duplicate = hashes.duplicated().to_numpy(copy=True)
+    first = hashes[~duplicate].tolist()
+    duplicate[~duplicate] = np.fromiter(map(seen.__contains__, first), dtype=bool, count=len(first))
+    seen.update(first)
+    return duplicate
+
+
+def chunk_masks(raw, month, district, counts, known=None, seen=None):
+    """Boolean mask per check over the rows of one raw chunk.
+
+    ``month`` and ``district`` are the parsed/normalized columns and
+    ``counts`` maps each present age column to its to_numeric result, so no
+    column is parsed again here. ``known`` is the state's set of valid
+    district names, or None to skip that check. ``seen`` carries row hashes
+    across chunks (see duplicate_rows); without it duplicates are only
+    looked for within the chunk.
+    """
+    masks = {
+        'bad_date': month.isna().to_numpy(),
+        'duplicate_row': duplicate_rows(raw, set() if seen is None else seen),
+        'missing_district': _blank_strings(raw['district']),
+    }
+    blank = np.zeros(len(raw), dtype=bool)
+    non_numeric = np.zeros(len(raw), dtype=bool)
+    negative = np.zeros(len(raw), dtype=bool)
+    for col, parsed in counts.items():
+        missing = raw[col].isna().to_numpy()
+        blank |= missing
+        non_numeric |= parsed.isna().to_numpy() & ~missing
+        negative |= (parsed < 0).to_numpy()
+    masks.update(blank_count=blank, non_numeric=non_numeric, negative_count=negative)
+    if known is not None:
+        masks['unknown_district'] = ~district.isin(known).to_numpy() & ~masks['missing_district']
+    return masks
+
+
+class FileReport:
+    """Quality counts and sample rows for one raw file, accumulated chunk by chunk."""
+
+    def __init__(self, path, state, category, known=None, max_bad_fraction=None):
+        self.path = path
+        self.state = state
+        self.category = category
+        self.known = known
+        self.max_bad_fraction = max_bad_fraction
+        self.error = None
+        self.rows = 0
+        self.bad_rows = 0
+        self.counts = dict.fromkeys(CHECKS, 0)
+        self.samples = {}
+        self.missing_columns = []
+        self.seen = set()
+
+    def check(self, raw, month, district, counts, missing_columns=()):
+        """Run every check on one chunk (see chunk_masks) and record the results."""
+        self.missing_columns += [c for c in missing_columns if c not in self.missing_columns]
+        self.record(raw, chunk_masks(raw, month, district, counts, self.known, self.seen))
+
+    def fail(self, message):
+        """Record a file-level error; in fail-fast mode it aborts the run."""
+        self.error = message
+        if self.max_bad_fraction is not None:
+            raise ValidationError(f"{self.path}: {message}")
+
+    def record(self, raw, masks):
+        """Fold one chunk's masks into the report; raises ValidationError past the threshold."""
+        flagged = np.zeros(len(raw), dtype=bool)
+        for check, mask in masks.items():
+            hits = int(mask.sum())
+            if not hits:
+                continue
+            self.counts[check] += hits
+            flagged |= mask
+            samples = self.samples.setdefault(check, [])
+            if len(samples) < SAMPLE_ROWS:
+                rows = raw[mask].head(SAMPLE_ROWS - len(samples))
+                # Line numbers in the file: header is line 1, chunks keep a running index
+                samples += [{'line': int(i) + 2, **{k: str(v) for k, v in row.items()}}
+                            for i, row in zip(rows.index, rows.to_dict('records'))]
+        self.rows += len(raw)
+        self.bad_rows += int(flagged.sum())
+        self.enforce(final=False)
+
+    def enforce(self, final=True):
+        if self.max_bad_fraction is None or not self.rows:
+            return
+        if (final or self.rows >= MIN_ROWS_BEFORE_ABORT) and self.bad_rows / self.rows > self.max_bad_fraction:
+            raise ValidationError(f"{self.path}: {self.bad_rows} of the first {self.rows} rows failed validation "
+                                  f"(> {self.max_bad_fraction:.1%}), aborting")
+
+    def to_dict(self):
+        return {
+            'file': self.path, 'state': self.state, 'category': self.category, 'error': self.error,
+            'rows': self.rows, 'bad_rows': self.bad_rows, 'missing_columns': self.missing_columns,
+            'counts': self.counts, 'samples': self.samples,
+        }
+
+    def summary(self):
+        if self.error:
+            return f"unusable: {self.error}"
+        issues = ', '.join(f"{check} {n}" for check, n in self.counts.items() if n)
+        if self.missing_columns:
+            issues = ', '.join(filter(None, [f"missing columns {self.missing_columns} (zero-filled)", issues]))
+        return f"{self.bad_rows}/{self.rows} rows flagged" + (f": {issues}" if issues else "")
+
+    def write(self, directory=REPORT_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.state}__{self.category}.json")
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path